@@ -1,7 +1,15 @@
-from flask import Blueprint, render_template, jsonify, request
+from flask import Blueprint, Response, render_template, jsonify, request
 import database as db
+import retention
+import export
 from logger import setup_logger
+from events import event_bus, format_sse
+from timing import tracer
+import os
 import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
 
 # Setup admin logger
 admin_logger = setup_logger('admin', 'admin.log')
@@ -12,6 +20,11 @@ admin_bp = Blueprint('admin', __name__,
                     static_folder='static',
                     url_prefix='/admin')
 
+# Function returning the number of active calls - will be set from server.py
+get_active_call_count = None
+# Function returning live TTS statistics per voice - will be set from server.py
+get_voice_statistics = None
+
 @admin_bp.route('/')
 def index():
     """Admin portal home page"""
@@ -37,7 +50,8 @@ def get_calls():
 def get_call_details(call_id):
     """API endpoint to get detailed call data"""
     try:
-        call = db.get_call_details(call_id)
+        # Fall back to the compressed archives for calls moved out by retention
+        call = db.get_call_details(call_id) or retention.get_archived_call(call_id)
         if call:
             return jsonify({"success": True, "call": call})
         else:
@@ -51,10 +65,29 @@ def get_call_details(call_id):
 
 @admin_bp.route('/api/performance')
 def get_performance():
-    """API endpoint to get performance metrics"""
+    """
+    API endpoint to get performance metrics, plus TTS latency and throughput
+    per voice over the last `hours` (default 24) and live since server start
+    """
+    try:
+        hours = float(request.args.get('hours', 24))
+    except ValueError:
+        hours = 0
+    if not hours > 0:
+        return jsonify({"success": False, "error": "hours must be a positive number"}), 400
+
     try:
         stats = db.get_performance_statistics()
-        return jsonify({"success": True, "stats": stats})
+        voices = db.get_voice_statistics(datetime.now() - timedelta(hours=hours))
+        # Only sampled spans are stored (TIMING_SAMPLE_RATE), so scale the
+        # counts up to estimate the real throughput
+        scale = 1 / tracer.sample_rate if tracer.sample_rate > 0 else 0
+        for voice in voices:
+            voice['requests_per_min'] = round(voice['count'] * scale / (hours * 60), 3)
+            voice['characters_per_min'] = round((voice['characters'] or 0) * scale / (hours * 60), 1)
+            voice['sample_rate'] = tracer.sample_rate
+        live_voices = get_voice_statistics() if get_voice_statistics is not None else None
+        return jsonify({"success": True, "stats": stats, "voices": voices, "live_voices": live_voices})
     except sqlite3.Error as e:
         admin_logger.error(f"Database error getting performance stats: {str(e)}")
         return jsonify({"success": False, "error": f"Database error: {str(e)}"}), 500
@@ -66,34 +99,159 @@ def get_performance():
 def get_db_stats():
     """API endpoint to get database statistics"""
     try:
-        conn = db.get_db_connection()
-        cursor = conn.cursor()
-        
-        # Get table counts
-        stats = {}
-        tables = ['calls', 'conversation_entries', 'performance_metrics']
+        # Row counts come from trigger-maintained counters, not COUNT(*) scans
+        counters = db.get_table_counters()
+        stats = {table: counters.get(table, 0) for table in db.COUNTED_TABLES}
         
-        for table in tables:
-            cursor.execute(f"SELECT COUNT(*) FROM {table}")
-            stats[table] = cursor.fetchone()[0]
-        
-        # Get active calls count
-        cursor.execute("SELECT COUNT(*) FROM calls WHERE status = 'in-progress'")
-        stats['active_calls'] = cursor.fetchone()[0]
+        # Active calls are tracked in memory by the server
+        if get_active_call_count is not None:
+            stats['active_calls'] = get_active_call_count()
+        else:
+            stats['active_calls'] = counters.get('calls_in_progress', 0)
         
         # Get database file size
-        import os
         if os.path.exists(db.DATABASE_PATH):
             stats['db_size'] = os.path.getsize(db.DATABASE_PATH) / (1024 * 1024)  # Size in MB
         else:
             stats['db_size'] = 0
         
-        conn.close()
         return jsonify({"success": True, "stats": stats})
     except Exception as e:
         admin_logger.error(f"Error getting database stats: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+@admin_bp.route('/api/search')
+def search_transcripts():
+    """
+    API endpoint to search transcripts. Query parameters: q (words and
+    "quoted phrases"), prefix=1 to match word prefixes, status, role,
+    intent, from and to dates, limit, and before_id (the previous page's
+    next_before_id). order=rank sorts by relevance instead of newest first.
+    """
+    text = request.args.get('q', '').strip()
+    if not text:
+        return jsonify({"success": False, "error": "Missing search query"}), 400
+
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+        before_id = request.args.get('before_id')
+        before_id = int(before_id) if before_id else None
+    except ValueError:
+        return jsonify({"success": False, "error": "limit and before_id must be integers"}), 400
+
+    try:
+        result = db.search_transcripts(
+            text,
+            prefix=request.args.get('prefix') in ('1', 'true'),
+            status=request.args.get('status'),
+            role=request.args.get('role'),
+            intent=request.args.get('intent'),
+            date_from=request.args.get('from'),
+            date_to=request.args.get('to'),
+            limit=limit,
+            before_id=before_id,
+            order=request.args.get('order', 'recent')
+        )
+        return jsonify({"success": True, **result})
+    except sqlite3.Error as e:
+        admin_logger.error(f"Database error searching transcripts: {str(e)}")
+        return jsonify({"success": False, "error": f"Database error: {str(e)}"}), 500
+    except Exception as e:
+        admin_logger.error(f"Error searching transcripts: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+
+@admin_bp.route('/api/export/<table>')
+def export_table(table):
+    """
+    Stream a bulk export of a table. Query parameters: format (csv.gz, arrow,
+    parquet) and since_id for incremental exports. The X-Export-Until-Id
+    header is the highest id included, to use as the next since_id.
+    """
+    file_format = request.args.get('format', 'csv.gz')
+    try:
+        since_id = int(request.args.get('since_id', 0))
+    except ValueError:
+        return jsonify({"success": False, "error": "since_id must be an integer"}), 400
+    
+    try:
+        until_id = export.max_id(table) if table in export.EXPORT_TABLES else None
+        chunks = export.export_table(table, file_format, since_id=since_id, until_id=until_id)
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    except Exception as e:
+        admin_logger.error(f"Error exporting {table}: {str(e)}")
+        return jsonify({"success": False, "error": str(e)}), 500
+    
+    response = Response(chunks, mimetype=export.EXPORT_FORMATS[file_format])
+    response.headers['Content-Disposition'] = f'attachment; filename="{table}-{since_id}-{until_id}.{file_format}"'
+    response.headers['X-Export-Until-Id'] = str(until_id)
+    return response
+
+# Each open event stream holds a server worker thread for as long as it is
+# open (up to EVENT_STREAM_MAX_SECONDS), since WSGI responses are streamed
+# synchronously. Open streams are therefore capped: clients over the cap get
+# the pending events and reconnect a few seconds later, which degrades to
+# cheap polling of the in-memory event buffer without holding a worker.
+MAX_EVENT_STREAMS = 20
+EVENT_STREAM_MAX_SECONDS = 300
+EVENT_STREAM_KEEPALIVE_SECONDS = 15
+OVERFLOW_RETRY_MS = 5000
+
+event_streams = {'open': 0, 'lock': threading.Lock()}
+
+@admin_bp.route('/api/events')
+def event_stream():
+    """Server-sent event stream of call, transcript and metric updates"""
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_id')
+    try:
+        last_id = int(last_event_id)
+    except (TypeError, ValueError):
+        # New client (or a malformed ID): start from now
+        last_id = event_bus.last_id
+    
+    with event_streams['lock']:
+        streaming = event_streams['open'] < MAX_EVENT_STREAMS
+        if streaming:
+            event_streams['open'] += 1
+    
+    def backlog(events, since_id):
+        # Tell the client to reload if it missed events that are no longer buffered
+        if events and events[0][0] > since_id + 1:
+            yield format_sse(events[0][0] - 1, "resync", {})
+        for event_id, event_type, data in events:
+            yield format_sse(event_id, event_type, data)
+    
+    # Both start with the client's position, so it reconnects with a
+    # Last-Event-ID even if no event arrives before the response ends
+    def overflow():
+        yield f"id: {last_id}\nretry: {OVERFLOW_RETRY_MS}\n\n"
+        yield from backlog(event_bus.events_since(last_id), last_id)
+    
+    def stream():
+        since_id = last_id
+        deadline = time.monotonic() + EVENT_STREAM_MAX_SECONDS
+        yield f"id: {last_id}\nretry: 1000\n\n"
+        while time.monotonic() < deadline:
+            events = event_bus.wait(since_id, EVENT_STREAM_KEEPALIVE_SECONDS)
+            if events:
+                yield from backlog(events, since_id)
+                since_id = events[-1][0]
+            else:
+                # Comment line keeps proxies from closing the connection
+                # and lets us notice clients that went away
+                yield ": keepalive\n\n"
+    
+    def release():
+        with event_streams['lock']:
+            event_streams['open'] -= 1
+    
+    response = Response(stream() if streaming else overflow(), mimetype='text/event-stream')
+    if streaming:
+        response.call_on_close(release)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
 @admin_bp.route('/call/<int:call_id>')
 def call_detail(call_id):
     """Admin page for detailed call information"""
@@ -0,0 +1,192 @@
+import os
+import time
+import heapq
+import itertools
+import threading
+from contextlib import contextmanager
+
+# Lower values are served first: turns of ongoing calls before the first
+# turn of a new call, and both before background rendering
+PRIORITY_ONGOING = 0
+PRIORITY_NEW_CALL = 1
+PRIORITY_BACKGROUND = 2
+
+# Default limits per upstream resource. A rate of 0 means no request quota,
+# only the concurrency limit.
+DEFAULT_LIMITS = {
+    "llm": {"max_concurrency": 16, "rate_per_s": 0},
+    "tts": {"max_concurrency": 16, "rate_per_s": 0},
+}
+
+# New calls are turned away once this many turns are already queued
+# beyond the concurrency limit of a resource
+DEFAULT_QUEUE_SLACK = 4
+# Longest a turn waits for a slot before giving up
+DEFAULT_SLOT_TIMEOUT_S = 10
+
+
+class SlotUnavailable(Exception):
+    """Raised when no slot frees up within the timeout (or the turn is cancelled)"""
+
+
+class ResourceLimiter:
+    """
+    Concurrency limit plus token-bucket request quota for one upstream
+    resource, granting slots to waiting turns in priority order.
+    """
+
+    def __init__(self, name, max_concurrency, rate_per_s=0, burst=None):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.rate_per_s = rate_per_s
+        self.burst = burst or max(max_concurrency, 1)
+        self.tokens = float(self.burst)
+        self.refilled_at = time.monotonic()
+
+        self.in_flight = 0
+        self.waiting = []  # heap of (priority, ticket)
+        self.tickets = itertools.count()
+        self.condition = threading.Condition()
+        self.stats = {"granted": 0, "timed_out": 0, "wait_ms": 0, "max_queue_depth": 0}
+
+    def _refill(self):
+        if not self.rate_per_s:
+            return
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate_per_s)
+        self.refilled_at = now
+
+    def _can_grant(self):
+        return self.in_flight < self.max_concurrency and (not self.rate_per_s or self.tokens >= 1)
+
+    def acquire(self, priority=PRIORITY_ONGOING, timeout=DEFAULT_SLOT_TIMEOUT_S, cancel_token=None):
+        """
+        Wait for a slot.
+
+        Raises:
+            SlotUnavailable: If no slot was granted within the timeout or the
+            cancel token was cancelled while waiting
+        """
+        start = time.monotonic()
+        deadline = start + timeout
+        with self.condition:
+            entry = (priority, next(self.tickets))
+            heapq.heappush(self.waiting, entry)
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], len(self.waiting))
+            try:
+                while True:
+                    self._refill()
+                    if self.waiting[0] == entry and self._can_grant():
+                        heapq.heappop(self.waiting)
+                        self.in_flight += 1
+                        if self.rate_per_s:
+                            self.tokens -= 1
+                        self.stats["granted"] += 1
+                        self.stats["wait_ms"] += int((time.monotonic() - start) * 1000)
+                        # The next turn in line may be able to go too
+                        self.condition.notify_all()
+                        return
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or (cancel_token is not None and cancel_token.cancelled):
+                        self.stats["timed_out"] += 1
+                        raise SlotUnavailable(f"No {self.name} slot available")
+                    # Wake up periodically for token refills and cancellation
+                    self.condition.wait(min(remaining, 0.1))
+            except SlotUnavailable:
+                self.waiting.remove(entry)
+                heapq.heapify(self.waiting)
+                self.condition.notify_all()
+                raise
+
+    def release(self):
+        with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    def saturated(self, queue_slack):
+        """True if more than queue_slack turns would be waiting"""
+        with self.condition:
+            self._refill()
+            backlog = self.in_flight + len(self.waiting) - self.max_concurrency
+            return backlog >= queue_slack or bool(self.rate_per_s and self.tokens < 1 and backlog >= 0)
+
+    def snapshot(self):
+        with self.condition:
+            return {
+                "in_flight": self.in_flight,
+                "queue_depth": len(self.waiting),
+                "max_concurrency": self.max_concurrency,
+                "rate_per_s": self.rate_per_s,
+                **self.stats
+            }
+
+
+class AdmissionController:
+    """
+    Admission control for call turns in front of the LLM and TTS quotas.
+
+    Turns wait for a slot in priority order, so ongoing calls keep being
+    served under load, and new calls are refused while the queues are full
+    instead of slowing every call down until they all time out.
+
+    Limits can be overridden with LLM_MAX_CONCURRENCY, LLM_RATE_PER_S,
+    TTS_MAX_CONCURRENCY, TTS_RATE_PER_S and ADMISSION_QUEUE_SLACK. More
+    resources (such as the TTS voices, see server.py) can be added at runtime.
+    """
+
+    def __init__(self, limits=None, queue_slack=None):
+        config = {name: dict(values) for name, values in DEFAULT_LIMITS.items()}
+        for name, values in config.items():
+            for key in values:
+                value = os.getenv(f"{name.upper()}_{key.upper()}")
+                if value:
+                    values[key] = float(value) if key == "rate_per_s" else int(value)
+        if limits:
+            for name, values in limits.items():
+                config.setdefault(name, {}).update(values)
+
+        self.limiters = {name: ResourceLimiter(name, **values) for name, values in config.items()}
+        self.queue_slack = queue_slack if queue_slack is not None else int(
+            os.getenv('ADMISSION_QUEUE_SLACK', DEFAULT_QUEUE_SLACK)
+        )
+        self.calls = {"admitted": 0, "rejected": 0}
+        self.lock = threading.Lock()
+
+    def add_resource(self, name, max_concurrency, rate_per_s=0):
+        """Add a resource limit unless the resource already has one"""
+        with self.lock:
+            if name not in self.limiters:
+                self.limiters[name] = ResourceLimiter(name, max_concurrency, rate_per_s)
+        return self.limiters[name]
+
+    def admit_new_call(self, resources=None):
+        """
+        Decide whether a new call can be taken on. Counts the decision.
+
+        Args:
+            resources: Names of the resources the call will use, defaults to all
+        """
+        limiters = self.limiters.values() if resources is None else [self.limiters[name] for name in resources]
+        admitted = not any(limiter.saturated(self.queue_slack) for limiter in limiters)
+        with self.lock:
+            self.calls["admitted" if admitted else "rejected"] += 1
+        return admitted
+
+    @contextmanager
+    def slot(self, resource, priority=PRIORITY_ONGOING, timeout=DEFAULT_SLOT_TIMEOUT_S, cancel_token=None):
+        """Hold a slot of a resource for the duration of the block"""
+        limiter = self.limiters[resource]
+        limiter.acquire(priority, timeout, cancel_token)
+        try:
+            yield
+        finally:
+            limiter.release()
+
+    def snapshot(self):
+        with self.lock:
+            calls = dict(self.calls)
+        return {
+            "calls": calls,
+            "queue_slack": self.queue_slack,
+            "resources": {name: limiter.snapshot() for name, limiter in list(self.limiters.items())},
+        }
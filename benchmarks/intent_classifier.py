@@ -0,0 +1,66 @@
+"""
+Benchmark intent classification throughput on a synthetic transcript corpus.
+
+Usage:
+    python -m benchmarks.intent_classifier [--utterances 100000]
+
+Utterances mix playbook objections, sale and hang-up phrases and unrelated
+small talk, padded with filler words the way speech recognition returns them.
+"""
+import argparse
+import random
+import statistics
+import time
+from collections import Counter
+from intent import IntentClassifier
+from playbooks.me_naiset import ME_NAISET_PLAYBOOK
+
+PHRASES = [
+    "ei minulla ole aikaa lukea", "se on liian kallista", "näen artikkelit netistä ilmaiseksi",
+    "joo haluan tilata", "kyllä kiitos", "ei kiitos", "en ole kiinnostunut", "soittakaa myöhemmin",
+    "mikä lehti tämä oli", "kuinka kauan tilaus kestää", "mitä se maksaa kuukaudessa",
+    "onko siinä paperilehti", "voitko toistaa", "hetkinen", "anteeksi en kuullut",
+]
+FILLER = ["no", "tota", "siis", "niinku", "öö", "joo", "että", "kyllä", "mutta", "nyt", "oikeastaan"]
+
+
+def make_corpus(size, seed=1):
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(size):
+        words = rng.sample(FILLER, rng.randint(0, 4)) + rng.choice(PHRASES).split()
+        if rng.random() < 0.3:
+            words += rng.choice(PHRASES).split()
+        corpus.append(" ".join(words).capitalize() + rng.choice([".", "?", ""]))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--utterances", type=int, default=100000)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    classifier = IntentClassifier(ME_NAISET_PLAYBOOK)
+    build_ms = (time.perf_counter() - start) * 1000
+    corpus = make_corpus(args.utterances)
+    print(f"Built classifier in {build_ms:.2f}ms ({len(classifier.phrases)} phrases, {len(classifier.stems)} stems)")
+
+    rates = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        for text in corpus:
+            classifier.classify(text)
+        rates.append(len(corpus) / (time.perf_counter() - start))
+    rate = statistics.median(rates)
+    print(f"{rate:,.0f} utterances/s ({1e6 / rate:.1f} µs per utterance)")
+
+    intents = Counter((classifier.classify(text) or {}).get("intent", "-") for text in corpus)
+    print("Intent distribution:")
+    for name, count in intents.most_common():
+        print(f"  {name:<48}{count / len(corpus):>7.1%}")
+
+
+if __name__ == "__main__":
+    main()
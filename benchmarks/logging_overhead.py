@@ -0,0 +1,119 @@
+"""
+Benchmark the request latency cost of logging: a webhook emitting the same log
+records as a conversation turn, with logging off, with the old synchronous
+file handlers and with the queued pipeline from logger.py.
+
+Usage:
+    python -m benchmarks.logging_overhead [--requests 2000] [--threads 8]
+
+Logs are written to a temporary directory. Runs without network access or
+API keys and doesn't touch the database.
+"""
+import argparse
+import logging
+import os
+import statistics
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import RotatingFileHandler
+from flask import Flask
+import logger as log_setup
+from middleware.logging_middleware import setup_logging_middleware
+
+LOGGERS = {
+    'server': 'server.log',
+    'llm_interactions': 'llm.log',
+    'database': 'database.log',
+    'tts': 'tts.log',
+}
+
+USER_INPUT = "Ei kiitos, minulla on jo tarpeeksi lehtiä luettavana."
+LLM_RESPONSE = "Ymmärrän hyvin! Saanko silti kertoa lyhyesti tämän viikon tarjouksesta? " * 3
+
+
+def sync_logger(name, log_file):
+    """The previous setup: file handler called directly on the request thread"""
+    logger = logging.getLogger(name)
+    logger.handlers.clear()
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    handler = RotatingFileHandler(
+        os.path.join(log_setup.LOG_DIR, log_file), maxBytes=10485760, backupCount=5, encoding='utf-8'
+    )
+    handler.setFormatter(log_setup.TEXT_FORMATTER)
+    logger.addHandler(handler)
+    return logger
+
+
+def create_app(loggers):
+    """Flask app whose /answer route logs like a real conversation turn"""
+    app = Flask(__name__)
+    setup_logging_middleware(app, loggers['server'])
+    server, llm, database, tts = (loggers[name] for name in LOGGERS)
+
+    @app.route('/answer', methods=['POST'])
+    def answer():
+        server.info("Received call with input: '%s'", USER_INPUT)
+        database.info("Added conversation entry %s for call %s", 1, 1)
+        llm.info("User input: %s", USER_INPUT)
+        llm.info("LLM response: %s", LLM_RESPONSE)
+        database.info("Added performance metric %s for call %s: %s took %sms", 1, 1, "llm_processing", 812)
+        database.info("Added conversation entry %s for call %s", 2, 1)
+        tts.info("Converting text to speech: %.50s...", LLM_RESPONSE)
+        tts.info("TTS conversion successful, saved to %s", "/tmp/tts_1.mp3")
+        database.info("Added performance metric %s for call %s: %s took %sms", 2, 1, "tts_processing", 402)
+        server.info("Response sent to caller: '%s'", LLM_RESPONSE)
+        return "<Response/>", 200, {'Content-Type': 'text/xml'}
+
+    return app
+
+
+def run(app, requests, threads):
+    """Send requests concurrently, returning per-request latencies in ms"""
+    def one(_):
+        client = app.test_client()
+        start = time.perf_counter()
+        client.post('/answer', data={'CallSid': 'CA123', 'From': '+358401234567'})
+        return (time.perf_counter() - start) * 1000
+
+    with ThreadPoolExecutor(threads) as pool:
+        return list(pool.map(one, range(requests)))
+
+
+def report(name, latencies):
+    latencies = sorted(latencies)
+    p99 = latencies[int(len(latencies) * 0.99) - 1]
+    print(f"{name:<10}{statistics.mean(latencies):>10.3f}{statistics.median(latencies):>10.3f}{p99:>10.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as log_dir:
+        log_setup.LOG_DIR = log_dir
+        print(f"{'logging':<10}{'mean ms':>10}{'p50 ms':>10}{'p99 ms':>10}")
+
+        loggers = {name: sync_logger(name, f) for name, f in LOGGERS.items()}
+        app = create_app(loggers)
+        run(app, 100, args.threads)  # warm up
+
+        logging.disable(logging.CRITICAL)
+        report("off", run(app, args.requests, args.threads))
+        logging.disable(logging.NOTSET)
+
+        report("sync", run(app, args.requests, args.threads))
+
+        loggers = {name: log_setup.setup_logger(name, f) for name, f in LOGGERS.items()}
+        app = create_app(loggers)
+        report("queued", run(app, args.requests, args.threads))
+        log_setup.shutdown_logging()
+        if log_setup.NonBlockingQueueHandler.dropped:
+            print(f"Dropped {log_setup.NonBlockingQueueHandler.dropped} records (queue full)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark server startup: time to import server.py and create the app in a
+fresh interpreter, with the slowest imports according to python -X importtime.
+
+Usage:
+    python -m benchmarks.startup_time [--runs 5] [--budget-ms 250] [--top 15]
+
+Exits with status 1 if the median startup time is over the budget, so it
+can guard against slow imports creeping back in.
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+
+STARTUP_SCRIPT = """
+import time
+start = time.perf_counter()
+import server
+app = server.create_app(warm_up=False)
+print((time.perf_counter() - start) * 1000)
+"""
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+DEFAULT_BUDGET_MS = 250
+
+
+def run_startup(importtime=False):
+    """Start a fresh interpreter, returning (startup ms, stderr)"""
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = [sys.executable] + (["-X", "importtime"] if importtime else []) + ["-c", STARTUP_SCRIPT]
+    env = dict(os.environ, PYTHONPATH=root)
+    result = subprocess.run(command, cwd=root, env=env, capture_output=True, text=True, check=True)
+    return float(result.stdout.strip().splitlines()[-1]), result.stderr
+
+
+def slowest_imports(stderr, top):
+    """Modules with the most self time, as (name, self ms, cumulative ms)"""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, _, name = match.groups()
+            imports.append((name, int(self_us) / 1000, int(cumulative_us) / 1000))
+    return sorted(imports, key=lambda item: -item[1])[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    run_startup()  # warm the filesystem cache and .pyc files
+    timings = [run_startup()[0] for _ in range(args.runs)]
+    _, stderr = run_startup(importtime=True)
+
+    print(f"{'module':<48}{'self ms':>10}{'cumul ms':>10}")
+    for name, self_ms, cumulative_ms in slowest_imports(stderr, args.top):
+        print(f"{name:<48}{self_ms:>10.1f}{cumulative_ms:>10.1f}")
+
+    median = statistics.median(timings)
+    print(f"\nStartup (import server + create_app): median {median:.0f}ms, "
+          f"min {min(timings):.0f}ms, max {max(timings):.0f}ms, budget {args.budget_ms:.0f}ms")
+    if median > args.budget_ms:
+        print("Over budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Simulate bursts of Twilio status callbacks against the /call_status endpoint.
+
+Usage:
+    python -m benchmarks.status_callbacks [--calls 2000] [--threads 16] [--bursts 3]
+
+Each simulated call sends initiated, ringing, answered and a final status
+(completed, busy, no-answer, failed or canceled), partly out of order the
+way Twilio can deliver them. Reports the callback ingest rate and the batch
+writes. Then checks that every call ended up with its final status in the
+database, and compares with writing each callback in its own transaction.
+
+Uses a temporary database and log directory; runs without network access.
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+FINAL_STATUSES = ["completed"] * 6 + ["busy", "no-answer", "failed", "canceled"]
+
+
+def make_callbacks(calls, burst, rng):
+    """Callbacks of a burst of calls, interleaved and partly out of order"""
+    expected = {}
+    callbacks = []
+    for index in range(calls):
+        call_sid = f"CA{burst:04d}{index:08d}"
+        final = rng.choice(FINAL_STATUSES)
+        events = [("initiated", None), ("ringing", None)]
+        if final == "completed":
+            events.append(("in-progress", None))
+        events.append((final, str(rng.randint(5, 300)) if final == "completed" else "0"))
+        if rng.random() < 0.1:
+            # Final callback overtakes an earlier one
+            events[-1], events[-2] = events[-2], events[-1]
+        expected[call_sid] = final
+        callbacks.append([
+            {"CallSid": call_sid, "CallStatus": status, "CallDuration": duration or "", "From": "+358401234567"}
+            for status, duration in events
+        ])
+
+    # Interleave the calls while keeping each call's own order
+    ordered = []
+    while callbacks:
+        call = rng.randrange(len(callbacks))
+        ordered.append(callbacks[call].pop(0))
+        if not callbacks[call]:
+            callbacks.pop(call)
+    return ordered, expected
+
+
+def fire(app, callbacks, threads):
+    """POST the callbacks from several threads; returns callbacks per second"""
+    chunks = [callbacks[i::threads] for i in range(threads)]
+
+    def post_all(chunk):
+        client = app.test_client()
+        for values in chunk:
+            response = client.post("/call_status", data=values)
+            assert response.status_code == 204, response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(post_all, chunks))
+    return len(callbacks) / (time.perf_counter() - start)
+
+
+def check(db, expected):
+    """Number of calls whose stored status differs from the expected final one"""
+    conn = db.get_db_connection()
+    try:
+        rows = dict(conn.execute("SELECT call_sid, status FROM calls").fetchall())
+    finally:
+        conn.close()
+    return sum(rows.get(call_sid) != status for call_sid, status in expected.items())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--calls", type=int, default=2000, help="calls per burst")
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--bursts", type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        import logger
+        logger.LOG_DIR = os.path.join(tmp, "logs")
+        import database as db
+        db.DATABASE_PATH = os.path.join(tmp, "benchmark.db")
+        import server
+
+        app = server.create_app(warm_up=False)
+        rng = random.Random(1)
+        all_expected = {}
+        for burst in range(args.bursts):
+            callbacks, expected = make_callbacks(args.calls, burst, rng)
+            all_expected.update(expected)
+            rate = fire(app, callbacks, args.threads)
+            start = time.perf_counter()
+            server.call_status.flush()
+            drain_ms = (time.perf_counter() - start) * 1000
+            print(f"burst {burst + 1}: {len(callbacks)} callbacks for {args.calls} calls, "
+                  f"{rate:,.0f} callbacks/s, final flush {drain_ms:.0f}ms")
+
+        stats = server.call_status.snapshot()
+        print(f"\nreceived {stats['received']}, coalesced {stats['coalesced']}, "
+              f"{stats['batches']} batches (largest {stats['max_batch']}), {stats['applied']} row changes, "
+              f"{stats['errors']} errors")
+        wrong = check(db, all_expected)
+        print(f"calls with a wrong final status: {wrong} of {len(all_expected)}")
+
+        # Baseline: the same kind of burst, one transaction per callback
+        callbacks, _ = make_callbacks(args.calls, args.bursts, rng)
+        start = time.perf_counter()
+        for values in callbacks:
+            duration = values["CallDuration"]
+            db.apply_call_status_updates([{
+                "call_sid": values["CallSid"],
+                "status": values["CallStatus"],
+                "timestamp": datetime.now(),
+                "duration": int(duration) if duration else None,
+                "caller_number": values["From"],
+            }])
+        rate = len(callbacks) / (time.perf_counter() - start)
+        print(f"\nunbatched baseline (database write only): {rate:,.0f} callbacks/s")
+        logger.shutdown_logging()
+        return 1 if wrong else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
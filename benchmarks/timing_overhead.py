@@ -0,0 +1,113 @@
+"""
+Benchmark the per-span overhead of timing.measure_time.
+
+Usage:
+    python -m benchmarks.timing_overhead [--spans 200000] [--budget-us 3]
+
+Compares an empty loop against spans without storage, nested spans,
+unsampled spans, spans handed to a store function, and the previous
+datetime.now() based context manager. Exits with status 1 if a stored span
+costs more than the budget.
+"""
+import argparse
+import statistics
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from timing import Tracer, measure_time, tracer
+
+
+@contextmanager
+def datetime_measure_time(call_id, step_name, store_func, metadata=None):
+    """The previous implementation, for comparison"""
+    start_time = datetime.now()
+    try:
+        yield
+    finally:
+        end_time = datetime.now()
+        if store_func and callable(store_func):
+            store_func(call_id, step_name, start_time, end_time, metadata)
+
+
+def discard(call_id, step_name, start_time, end_time, metadata=None):
+    pass
+
+
+def per_span_ns(body, spans, runs):
+    """Median nanoseconds per loop iteration"""
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter_ns()
+        body(spans)
+        timings.append((time.perf_counter_ns() - start) / spans)
+    return statistics.median(timings)
+
+
+def empty(spans):
+    for _ in range(spans):
+        pass
+
+
+def plain(spans):
+    for _ in range(spans):
+        with measure_time("CA1", "step", None):
+            pass
+
+
+def nested(spans):
+    for _ in range(spans // 2):
+        with measure_time("CA1", "outer", None):
+            with measure_time("CA1", "inner", None):
+                pass
+
+
+def stored(spans):
+    metadata = {"input_length": 10}
+    for _ in range(spans):
+        with measure_time("CA1", "step", discard, metadata):
+            pass
+    tracer.flush(timeout=60)
+
+
+def unsampled(spans):
+    sampled = Tracer(capacity=16, sample_rate=0.01)
+    for _ in range(spans):
+        with sampled.span("step", "CA1"):
+            pass
+
+
+def previous(spans):
+    metadata = {"input_length": 10}
+    for _ in range(spans):
+        with datetime_measure_time("CA1", "step", discard, metadata):
+            pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--spans", type=int, default=200000)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-us", type=float, default=3.0)
+    args = parser.parse_args()
+
+    baseline = per_span_ns(empty, args.spans, args.runs)
+    results = {}
+    for name, body in [("span", plain), ("nested (per span)", nested), ("stored", stored),
+                       ("unsampled (1%)", unsampled), ("previous datetime.now()", previous)]:
+        results[name] = per_span_ns(body, args.spans, args.runs) - baseline
+
+    print(f"{'case':<28}{'µs per span':>12}")
+    for name, overhead_ns in results.items():
+        print(f"{name:<28}{overhead_ns / 1000:>12.2f}")
+
+    resolution = time.get_clock_info("perf_counter").resolution
+    print(f"\nperf_counter resolution {resolution * 1e9:.0f}ns, budget {args.budget_us:.1f}µs per stored span")
+    if results["stored"] / 1000 > args.budget_us:
+        print("Over budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,86 @@
+"""
+Benchmark transcript search latency on a synthetic database.
+
+Usage:
+    python -m benchmarks.transcript_search [--entries 1000000] [--runs 20]
+
+Builds the database in a temporary directory; the real database is only
+opened for the usual schema initialization on import.
+"""
+import argparse
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+import database as db
+
+PHRASES = [
+    "Ei ole aikaa nyt", "Liian kallista minulle", "Näen artikkelit netistä",
+    "Kiitos, kuulostaa hyvältä", "Soittakaa myöhemmin uudelleen", "Mikä tarjous se oli",
+    "Minulla on jo tilaus", "Kuinka paljon se maksaa kuukaudessa", "Sää on ollut kaunis",
+    "Joo, voin ottaa kokeilujakson", "En ole kiinnostunut", "Lähettäkää tietoa sähköpostiin",
+]
+
+QUERIES = [
+    ("word", "kallista", {}),
+    ("phrase", '"ei ole aikaa"', {}),
+    ("prefix", "kallis", {"prefix": True}),
+    ("filtered", "tilaus", {"status": "completed", "role": "user"}),
+    ("date range", "tarjous", {"date_from": "2025-01-01", "date_to": "2025-01-31"}),
+    ("ranked", "kokeilujakso", {"prefix": True, "order": "rank"}),
+    ("rare", '"sää on ollut"', {}),
+]
+
+
+def populate(entries, entries_per_call=10):
+    """Insert synthetic calls and transcripts, maintaining the index via triggers"""
+    conn = db.get_db_connection()
+    start = datetime(2025, 1, 1)
+    calls = entries // entries_per_call
+    conn.executemany(
+        "INSERT INTO calls (call_sid, start_time, status, caller_number) VALUES (?, ?, ?, ?)",
+        ((f"CA{i:08d}", start + timedelta(minutes=i), random.choice(["completed", "failed"]), "+358401234567")
+         for i in range(calls))
+    )
+    conn.executemany(
+        "INSERT INTO conversation_entries (call_id, timestamp, role, content) VALUES (?, ?, ?, ?)",
+        ((i // entries_per_call + 1, start + timedelta(minutes=i // entries_per_call, seconds=i % 60),
+          "user" if i % 2 else "assistant", " ".join(random.sample(PHRASES, 2)))
+         for i in range(calls * entries_per_call))
+    )
+    conn.commit()
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--entries", type=int, default=1000000)
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db.DATABASE_PATH = os.path.join(tmp, 'benchmark.db')
+        db.init_db()
+
+        start = time.perf_counter()
+        populate(args.entries)
+        elapsed = time.perf_counter() - start
+        print(f"Inserted {args.entries} entries in {elapsed:.1f}s ({args.entries / elapsed:.0f}/s, index included)")
+
+        print(f"{'query':<14}{'p50 ms':>10}{'max ms':>10}{'results':>10}")
+        for name, text, options in QUERIES:
+            timings = []
+            before_id = None
+            for _ in range(args.runs):
+                # Page through results like the admin UI would
+                start = time.perf_counter()
+                result = db.search_transcripts(text, limit=20, before_id=before_id, **options)
+                timings.append((time.perf_counter() - start) * 1000)
+                before_id = result["next_before_id"]
+            print(f"{name:<14}{statistics.median(timings):>10.2f}{max(timings):>10.2f}{len(result['results']):>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Benchmark ElevenLabs output formats: time to first byte, total synthesis time
+and bytes transferred per format.
+
+Usage:
+    python -m benchmarks.tts_formats [--runs 3] [--chunk-size 8192]
+
+Time to first byte is the first audio from ElevenLabs as recorded by
+stream_speech, and bytes exclude the WAV header it adds to raw formats, so
+raw and encoded formats compare fairly.
+
+Requires ELEVENLABS_API_KEY in the environment or .env file.
+"""
+import argparse
+import statistics
+import time
+from tts.elevenlabs_client import ElevenLabsClient
+from tts.formats import OUTPUT_FORMATS, wav_header
+
+SAMPLE_TEXT = "Hei, täällä Marja Me Naiset -lehdestä. Soitinko huonoon aikaan?"
+
+
+def measure(client, text):
+    """Synthesize text once, returning (ttfb_ms, total_ms, bytes)"""
+    start = time.perf_counter()
+    total_bytes = 0
+    for chunk in client.stream_speech(text):
+        total_bytes += len(chunk)
+    end = time.perf_counter()
+    # The header of raw formats is generated locally before any audio arrives
+    total_bytes -= len(wav_header(client.output_format))
+    ttfb_ms = client.channel().first_byte_ms[-1]
+    return ttfb_ms, (end - start) * 1000, total_bytes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--chunk-size", type=int, default=8192)
+    parser.add_argument("--text", default=SAMPLE_TEXT)
+    args = parser.parse_args()
+
+    print(f"{'format':<16}{'ttfb ms':>10}{'total ms':>10}{'bytes':>10}")
+    for name in OUTPUT_FORMATS:
+        client = ElevenLabsClient(output_format=name, chunk_size=args.chunk_size)
+        results = [measure(client, args.text) for _ in range(args.runs)]
+        ttfb = statistics.median(r[0] for r in results)
+        total = statistics.median(r[1] for r in results)
+        size = statistics.median(r[2] for r in results)
+        print(f"{name:<16}{ttfb:>10.0f}{total:>10.0f}{size:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Check the TwiML templates in twiml.py against the Twilio library and
+benchmark building the responses both ways.
+
+Usage:
+    python -m benchmarks.twiml_templates [--iterations 20000]
+
+Every response the server sends is built with VoiceResponse/Gather the way
+server.py used to, and compared byte for byte with the template output for
+texts and URLs that need escaping. Exits with status 1 on any difference.
+"""
+import argparse
+import sys
+import time
+from twilio.twiml.voice_response import VoiceResponse
+import twiml
+from tts.voices import DEFAULT_VOICE
+
+VOICE, LANGUAGE = DEFAULT_VOICE["say_voice"], DEFAULT_VOICE["language"]
+TURN = "9b2f4c1d8e7a4b6f"
+
+VALUES = [
+    "Kiitos ajastasi. Näkemiin!",
+    "Hinta on 9,90 € <kuukaudessa> & \"ensimmäinen\" kuukausi 'ilmaiseksi'",
+    "Rivi yksi\nrivi kaksi\ttabulaattori",
+    "https://example.ngrok.app/audio/abc123.mp3?token=a&b=<c>",
+    "]]> --> <!-- &amp; &#10;",
+    "",
+]
+
+
+def library_listen(prompt=None, language=LANGUAGE, turn=TURN):
+    response = VoiceResponse()
+    gather = twiml.build_gather(language, turn)
+    if prompt:
+        prompt(gather)
+    response.append(gather)
+    response.redirect('/end_call')
+    return str(response)
+
+
+def library_respond(prompt, target=None):
+    response = VoiceResponse()
+    prompt(response)
+    if target is None:
+        response.hangup()
+    else:
+        response.redirect(target)
+    return str(response)
+
+
+def say(verb, text, voice=VOICE, language=LANGUAGE):
+    verb.say(text, voice=voice, language=language)
+
+
+# (name, built with the library, built from the template)
+CASES = [
+    ("listen", lambda v: library_listen(), lambda v: twiml.listen(LANGUAGE, TURN)),
+    # The turn ID is an attribute value, which is escaped differently from text
+    ("listen turn", lambda v: library_listen(turn=v), lambda v: twiml.listen(LANGUAGE, v)),
+    ("play_and_listen", lambda v: library_listen(lambda g: g.play(v)), lambda v: twiml.play_and_listen(v, LANGUAGE, TURN)),
+    ("say_and_listen", lambda v: library_listen(lambda g: say(g, v)),
+     lambda v: twiml.say_and_listen(v, VOICE, LANGUAGE, TURN)),
+    ("say_and_listen en-US", lambda v: library_listen(lambda g: say(g, v, "Polly.Joanna", "en-US"), "en-US"),
+     lambda v: twiml.say_and_listen(v, "Polly.Joanna", "en-US", TURN)),
+    ("play_and_hangup", lambda v: library_respond(lambda r: r.play(v)), lambda v: twiml.play_and_hangup(v)),
+    ("say_and_hangup", lambda v: library_respond(lambda r: say(r, v)), lambda v: twiml.say_and_hangup(v, VOICE, LANGUAGE)),
+    ("play_and_redirect", lambda v: library_respond(lambda r: r.play(v), "/pending/1f2e"),
+     lambda v: twiml.play_and_redirect(v, "/pending/1f2e")),
+    ("say_and_redirect", lambda v: library_respond(lambda r: say(r, v), "/pending/1f2e"),
+     lambda v: twiml.say_and_redirect(v, "/pending/1f2e", VOICE, LANGUAGE)),
+]
+
+
+def per_call_us(func, value, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func(value)
+    return (time.perf_counter() - start) / iterations * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    mismatches = 0
+    for name, library, template in CASES:
+        for value in VALUES:
+            expected, actual = library(value), template(value)
+            if expected != actual:
+                mismatches += 1
+                print(f"MISMATCH {name} for {value!r}:\n  library:  {expected}\n  template: {actual}")
+    print(f"{len(CASES) * len(VALUES)} responses compared, {mismatches} mismatches\n")
+
+    print(f"{'response':<24}{'library µs':>12}{'template µs':>13}{'speedup':>9}")
+    for name, library, template in CASES:
+        value = VALUES[1]
+        before = per_call_us(library, value, args.iterations)
+        after = per_call_us(template, value, args.iterations)
+        print(f"{name:<24}{before:>12.2f}{after:>13.2f}{before / after:>8.0f}x")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
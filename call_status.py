@@ -0,0 +1,141 @@
+import os
+import time
+import threading
+from datetime import datetime
+from logger import setup_logger
+import database as db
+
+call_status_logger = setup_logger('call_status', 'call_status.log')
+
+# How often pending status changes are written, unless a batch fills up first
+DEFAULT_FLUSH_INTERVAL_S = 0.2
+DEFAULT_BATCH_SIZE = 500
+# How often the reapers (stale call cleanup) run
+DEFAULT_REAP_INTERVAL_S = 60
+
+
+class CallStatusTracker:
+    """
+    Collects Twilio status callbacks and writes them to the database in batches.
+
+    Callbacks are coalesced per CallSid, keeping the most advanced status, so
+    the initiated/ringing/answered/completed callbacks of a call that arrive
+    close together become one row change. A background thread applies the
+    pending changes every flush_interval seconds, or as soon as batch_size
+    calls are pending, in a single transaction, and runs the reapers every
+    reap_interval seconds.
+
+    The intervals can be set with CALL_STATUS_FLUSH_INTERVAL_S and
+    CALL_STATUS_BATCH_SIZE.
+    """
+
+    def __init__(self, flush_interval=None, batch_size=None, reap_interval=DEFAULT_REAP_INTERVAL_S, reapers=None):
+        self.flush_interval = flush_interval if flush_interval is not None else float(
+            os.getenv('CALL_STATUS_FLUSH_INTERVAL_S', DEFAULT_FLUSH_INTERVAL_S)
+        )
+        self.batch_size = batch_size or int(os.getenv('CALL_STATUS_BATCH_SIZE', DEFAULT_BATCH_SIZE))
+        self.reap_interval = reap_interval
+        self.reapers = list(reapers or [])
+
+        self.pending = {}  # call_sid -> latest change
+        self.lock = threading.Lock()
+        self.flush_lock = threading.Lock()
+        self.wake = threading.Event()
+        self.thread = None
+        self.stats = {"received": 0, "coalesced": 0, "batches": 0, "applied": 0, "max_batch": 0, "errors": 0}
+
+    def start(self):
+        """Start the background writer (idempotent)"""
+        with self.lock:
+            if self.thread is None:
+                self.thread = threading.Thread(target=self._run, name="call-status", daemon=True)
+                self.thread.start()
+
+    def record(self, call_sid, status, duration=None, caller_number=None):
+        """
+        Queue a status change of a call.
+
+        Returns:
+            bool: True if the status is final (the call is over)
+        """
+        update = {
+            "call_sid": call_sid,
+            "status": status,
+            "timestamp": datetime.now(),
+            "duration": duration,
+            "caller_number": caller_number,
+        }
+        with self.lock:
+            self.stats["received"] += 1
+            if call_sid in self.pending:
+                self.stats["coalesced"] += 1
+            self._merge(update)
+            full = len(self.pending) >= self.batch_size
+        if full:
+            self.wake.set()
+        return db.call_status_rank(status) >= db.TERMINAL_STATUS_RANK
+
+    def _merge(self, update):
+        current = self.pending.get(update["call_sid"])
+        if current is None:
+            self.pending[update["call_sid"]] = update
+            return
+        if db.call_status_rank(update["status"]) >= db.call_status_rank(current["status"]):
+            current["status"] = update["status"]
+            current["timestamp"] = update["timestamp"]
+        current["duration"] = update["duration"] if update["duration"] is not None else current["duration"]
+        current["caller_number"] = current["caller_number"] or update["caller_number"]
+
+    def flush(self):
+        """
+        Write all pending changes now.
+
+        Returns:
+            int: Number of calls created or changed
+        """
+        with self.flush_lock:
+            with self.lock:
+                updates, self.pending = list(self.pending.values()), {}
+            if not updates:
+                return 0
+            try:
+                applied = db.apply_call_status_updates(updates)
+            except Exception as e:
+                call_status_logger.error("Error writing %d call status changes, retrying: %s", len(updates), e)
+                with self.lock:
+                    self.stats["errors"] += 1
+                    newer, self.pending = self.pending, {}
+                    for update in updates + list(newer.values()):
+                        self._merge(update)
+                return 0
+            with self.lock:
+                self.stats["batches"] += 1
+                self.stats["applied"] += applied
+                self.stats["max_batch"] = max(self.stats["max_batch"], len(updates))
+            return applied
+
+    def reap(self):
+        for reaper in self.reapers:
+            try:
+                reaper()
+            except Exception as e:
+                call_status_logger.error("Error reaping stale calls: %s", e)
+
+    def _run(self):
+        next_reap = time.monotonic() + self.reap_interval
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+            if time.monotonic() >= next_reap:
+                self.reap()
+                next_reap = time.monotonic() + self.reap_interval
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "pending": len(self.pending),
+                "flush_interval_s": self.flush_interval,
+                "batch_size": self.batch_size,
+                **self.stats
+            }
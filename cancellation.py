@@ -0,0 +1,37 @@
+import uuid
+import threading
+
+
+class CancelToken:
+    """
+    Cancellation flag shared by the LLM and TTS work of a single call turn.
+
+    The server creates one token per turn and cancels it when the caller
+    starts speaking over the assistant (barge-in), so any streaming request
+    still running for the old turn can stop early and release the upstream
+    connection.
+    """
+
+    def __init__(self, parent=None):
+        self._event = threading.Event()
+        self.reason = None
+        # Identifies the turn in callback URLs (see server.speech_partial)
+        self.id = uuid.uuid4().hex
+        # A child token is also cancelled when its parent is, e.g. the
+        # individual model attempts of a hedged LLM request
+        self.parent = parent
+
+    def cancel(self, reason="barge_in"):
+        """Mark the turn as cancelled. Returns True if this call cancelled it."""
+        if self._event.is_set():
+            return False
+        self.reason = reason
+        self._event.set()
+        return True
+
+    @property
+    def cancelled(self):
+        if self._event.is_set():
+            return True
+        return self.parent is not None and self.parent.cancelled
+
@@ -0,0 +1,12 @@
+import threading
+from dotenv import load_dotenv
+
+_env = {'loaded': False, 'lock': threading.Lock()}
+
+
+def load_env():
+    """Load the .env file into the environment, once per process"""
+    with _env['lock']:
+        if not _env['loaded']:
+            load_dotenv()
+            _env['loaded'] = True
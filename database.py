@@ -1,16 +1,27 @@
 import os
+import re
+import html
 import sqlite3
 import json
-from datetime import datetime
+import threading
+from datetime import datetime, timedelta
 from logger import setup_logger
+from events import event_bus
 
 # Setup database logger
 db_logger = setup_logger('database', 'database.log')
 
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), 'ai_telemarketer.db')
 
-def get_db_connection():
-    """Create a connection to the SQLite database"""
+# Stored in PRAGMA user_version by init_db(). Bump it whenever init_db()
+# changes the schema, so existing databases are upgraded on next start.
+SCHEMA_VERSION = 2
+
+# Database paths whose schema this process has already checked
+_schema_checked = set()
+_schema_lock = threading.Lock()
+
+def _connect():
     try:
         conn = sqlite3.connect(DATABASE_PATH)
         conn.row_factory = sqlite3.Row  # Return rows as dictionaries
@@ -19,12 +30,40 @@ def get_db_connection():
         db_logger.error(f"Database connection error: {str(e)}")
         raise
 
+def get_db_connection():
+    """Create a connection to the SQLite database, checking its schema on first use"""
+    if DATABASE_PATH not in _schema_checked:
+        ensure_schema()
+    return _connect()
+
+def ensure_schema():
+    """
+    Initialize or upgrade the database unless its user_version says it is
+    current. Checked once per process, so startup only costs one PRAGMA read.
+    """
+    with _schema_lock:
+        if DATABASE_PATH in _schema_checked:
+            return
+        conn = _connect()
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            conn.close()
+        if version < SCHEMA_VERSION:
+            init_db()
+        _schema_checked.add(DATABASE_PATH)
+
 def init_db():
     """Initialize the database with required tables"""
-    conn = get_db_connection()
+    conn = _connect()
     try:
         cursor = conn.cursor()
         
+        # Lets retention.py return freed pages without a full VACUUM. Only
+        # takes effect on a new database; existing ones need
+        # python manage.py enable-incremental-vacuum
+        cursor.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        
         # Create calls table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS calls (
@@ -46,10 +85,16 @@ def init_db():
             timestamp TIMESTAMP,
             role TEXT,  -- 'user' or 'assistant'
             content TEXT,
+            intent TEXT,  -- caller intent tagged by intent.py, e.g. 'sale'
             FOREIGN KEY (call_id) REFERENCES calls (id)
         )
         ''')
         
+        # Columns added later, missing from databases created before them
+        cursor.execute("PRAGMA table_info(conversation_entries)")
+        if 'intent' not in {row['name'] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE conversation_entries ADD COLUMN intent TEXT")
+        
         # Create performance metrics table
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS performance_metrics (
@@ -63,7 +108,33 @@ def init_db():
             FOREIGN KEY (call_id) REFERENCES calls (id)
         )
         ''')
+        # Per-step statistics over a time window (see get_voice_statistics)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_performance_metrics_step_time ON performance_metrics (step_name, start_time)"
+        )
         
+        # Index of calls moved to compressed archives by retention.py
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS archived_calls (
+            call_id INTEGER PRIMARY KEY,
+            call_sid TEXT,
+            start_time TIMESTAMP,
+            archive_file TEXT
+        )
+        ''')
+        
+        # Last exported id per table for incremental exports (see export.py)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_watermarks (
+            table_name TEXT PRIMARY KEY,
+            last_id INTEGER NOT NULL
+        )
+        ''')
+        
+        init_counters(cursor)
+        init_search_index(cursor)
+        
+        cursor.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
         conn.commit()
         db_logger.info("Database initialized successfully")
     except Exception as e:
@@ -73,19 +144,339 @@ def init_db():
     finally:
         conn.close()
 
-def create_call(call_sid, caller_number):
-    """Create a new call record in the database"""
+# Row counters kept up to date by triggers, so statistics don't need COUNT(*)
+# scans. 'calls_in_progress' counts calls whose status is 'in-progress'.
+COUNTED_TABLES = ['calls', 'conversation_entries', 'performance_metrics']
+
+COUNTER_QUERIES = {
+    'calls': "SELECT COUNT(*) FROM calls",
+    'conversation_entries': "SELECT COUNT(*) FROM conversation_entries",
+    'performance_metrics': "SELECT COUNT(*) FROM performance_metrics",
+    'calls_in_progress': "SELECT COUNT(*) FROM calls WHERE status = 'in-progress'",
+}
+
+def init_counters(cursor):
+    """Create the counters table and the triggers that maintain it"""
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS table_counters (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL DEFAULT 0
+    )
+    ''')
+
+    for table in COUNTED_TABLES:
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_count_insert AFTER INSERT ON {table}
+        BEGIN
+            UPDATE table_counters SET value = value + 1 WHERE name = '{table}';
+        END
+        ''')
+        cursor.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS {table}_count_delete AFTER DELETE ON {table}
+        BEGIN
+            UPDATE table_counters SET value = value - 1 WHERE name = '{table}';
+        END
+        ''')
+
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS calls_in_progress_insert AFTER INSERT ON calls
+    WHEN NEW.status = 'in-progress'
+    BEGIN
+        UPDATE table_counters SET value = value + 1 WHERE name = 'calls_in_progress';
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS calls_in_progress_update AFTER UPDATE OF status ON calls
+    WHEN (OLD.status = 'in-progress') != (NEW.status = 'in-progress')
+    BEGIN
+        UPDATE table_counters
+        SET value = value + (CASE WHEN NEW.status = 'in-progress' THEN 1 ELSE -1 END)
+        WHERE name = 'calls_in_progress';
+    END
+    ''')
+    cursor.execute('''
+    CREATE TRIGGER IF NOT EXISTS calls_in_progress_delete AFTER DELETE ON calls
+    WHEN OLD.status = 'in-progress'
+    BEGIN
+        UPDATE table_counters SET value = value - 1 WHERE name = 'calls_in_progress';
+    END
+    ''')
+
+    # Seed counters that don't exist yet from real counts (one-off scan)
+    cursor.execute("SELECT name FROM table_counters")
+    existing = {row[0] for row in cursor.fetchall()}
+    for name, query in COUNTER_QUERIES.items():
+        if name not in existing:
+            cursor.execute(query)
+            cursor.execute(
+                "INSERT INTO table_counters (name, value) VALUES (?, ?)",
+                (name, cursor.fetchone()[0])
+            )
+
+def get_table_counters():
+    """Get the maintained row counters as a dict (O(1), no table scans)"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name, value FROM table_counters")
+        return {row['name']: row['value'] for row in cursor.fetchall()}
+    finally:
+        conn.close()
+
+def reconcile_counters(fix=False):
+    """
+    Compare the maintained counters against real counts
+
+    Args:
+        fix: Overwrite counters that drifted with the real counts
+
+    Returns:
+        dict: name -> {"counter": maintained value, "actual": real count}
+    """
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        # Count and fix in one write transaction so no insert slips in between
+        cursor.execute("BEGIN IMMEDIATE")
+        cursor.execute("SELECT name, value FROM table_counters")
+        counters = {row['name']: row['value'] for row in cursor.fetchall()}
+
+        report = {}
+        for name, query in COUNTER_QUERIES.items():
+            cursor.execute(query)
+            actual = cursor.fetchone()[0]
+            report[name] = {"counter": counters.get(name), "actual": actual}
+            if fix and counters.get(name) != actual:
+                cursor.execute(
+                    "INSERT OR REPLACE INTO table_counters (name, value) VALUES (?, ?)",
+                    (name, actual)
+                )
+                db_logger.warning(f"Counter {name} drifted ({counters.get(name)} != {actual}), fixed")
+        conn.commit()
+        return report
+    except Exception as e:
+        db_logger.error(f"Error reconciling counters: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+# Full-text index over conversation_entries.content. It is an external content
+# table (the text is stored only once) kept in sync by triggers. unicode61 with
+# remove_diacritics 0 keeps ä and ö distinct, so "sää" doesn't match "saa".
+# There is no Finnish stemmer; prefix queries ("kallis*") cover inflections.
+SEARCH_TABLE = 'conversation_search'
+
+def init_search_index(cursor):
+    """Create the transcript search index and its triggers, building it once"""
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (SEARCH_TABLE,))
+    exists = cursor.fetchone() is not None
+    try:
+        cursor.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5(
+            content,
+            content='conversation_entries',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 0',
+            prefix='2 3'
+        )
+        ''')
+    except sqlite3.OperationalError as e:
+        # SQLite built without FTS5: everything but search keeps working
+        db_logger.warning(f"Transcript search disabled: {str(e)}")
+        return
+
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS conversation_entries_search_insert AFTER INSERT ON conversation_entries
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} (rowid, content) VALUES (NEW.id, NEW.content);
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS conversation_entries_search_delete AFTER DELETE ON conversation_entries
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+    END
+    ''')
+    cursor.execute(f'''
+    CREATE TRIGGER IF NOT EXISTS conversation_entries_search_update AFTER UPDATE OF content ON conversation_entries
+    BEGIN
+        INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}, rowid, content) VALUES ('delete', OLD.id, OLD.content);
+        INSERT INTO {SEARCH_TABLE} (rowid, content) VALUES (NEW.id, NEW.content);
+    END
+    ''')
+
+    if not exists:
+        # Index the entries written before the index existed (one-off)
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild')")
+        db_logger.info("Built transcript search index")
+
+def rebuild_search_index():
+    """Rebuild the transcript search index from conversation_entries and optimize it"""
+    conn = get_db_connection()
+    try:
+        conn.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('rebuild')")
+        conn.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        conn.commit()
+    finally:
+        conn.close()
+
+def build_search_query(text, prefix=False):
+    """
+    Turn user search text into an FTS5 query. "Quoted text" is a phrase,
+    other words must all appear. FTS5 operators in the text are treated as
+    plain words, so user input can't cause query syntax errors.
+
+    Args:
+        text: Search text, e.g. 'liian kallista "ei ole aikaa"'
+        prefix: Also match words starting with each bare word
+
+    Returns:
+        str: FTS5 MATCH expression, or None if the text has no words
+    """
+    terms = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', text):
+        if phrase.strip():
+            terms.append('"' + phrase.strip().replace('"', '""') + '"')
+        elif word:
+            word = word.replace('"', '')
+            if word:
+                terms.append('"' + word + '"' + ('*' if prefix else ''))
+    return " ".join(terms) or None
+
+# Highlight markers, replaced with <mark> tags once the snippet is escaped
+_MARK_START, _MARK_END = '\x02', '\x03'
+
+def search_transcripts(text, prefix=False, status=None, role=None, intent=None, date_from=None,
+                       date_to=None, limit=20, before_id=None, order='recent'):
+    """
+    Search conversation entries by what was said.
+
+    Args:
+        text: Search text, see build_search_query()
+        prefix: Match word prefixes (useful for inflected Finnish words)
+        status: Only entries of calls with this status
+        role: Only 'user' or 'assistant' entries
+        intent: Only entries tagged with this intent (see intent.py)
+        date_from, date_to: Only entries with a timestamp in this range (ISO dates)
+        limit: Page size
+        before_id: Only entries with a smaller id (next page of 'recent' results)
+        order: 'recent' (newest first, cheapest) or 'rank' (best match first)
+
+    Returns:
+        dict: "results" with HTML-escaped snippets where matches are wrapped
+        in <mark> tags, "has_more", and "next_before_id" for the next page
+    """
+    query = build_search_query(text, prefix)
+    if query is None:
+        return {"results": [], "next_before_id": None}
+
+    conditions = [f"{SEARCH_TABLE} MATCH ?"]
+    params = [query]
+    if before_id is not None:
+        conditions.append(f"{SEARCH_TABLE}.rowid < ?")
+        params.append(before_id)
+    if status:
+        conditions.append("c.status = ?")
+        params.append(status)
+    if role:
+        conditions.append("e.role = ?")
+        params.append(role)
+    if intent:
+        conditions.append("e.intent = ?")
+        params.append(intent)
+    if date_from:
+        conditions.append("e.timestamp >= ?")
+        params.append(date_from)
+    if date_to:
+        # A bare date includes the whole day
+        conditions.append("e.timestamp < ?" if len(date_to) > 10 else "e.timestamp < date(?, '+1 day')")
+        params.append(date_to)
+
+    # Newest first walks the index in rowid order and can stop after one page;
+    # ranking has to score every match first
+    order_by = "rank" if order == 'rank' else f"{SEARCH_TABLE}.rowid DESC"
+
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
-        now = datetime.now()
         cursor.execute(
-            "INSERT INTO calls (call_sid, start_time, status, caller_number) VALUES (?, ?, ?, ?)",
-            (call_sid, now, "in-progress", caller_number)
+            f"""
+            SELECT e.id, e.call_id, e.timestamp, e.role, e.intent, c.call_sid, c.status,
+                   snippet({SEARCH_TABLE}, 0, '{_MARK_START}', '{_MARK_END}', '…', 16) AS snippet
+            FROM {SEARCH_TABLE}
+            JOIN conversation_entries e ON e.id = {SEARCH_TABLE}.rowid
+            JOIN calls c ON c.id = e.call_id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY {order_by}
+            LIMIT ?
+            """,
+            params + [limit + 1]
         )
-        call_id = cursor.lastrowid
+        rows = [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    for row in rows:
+        row['snippet'] = html.escape(row['snippet']).replace(_MARK_START, '<mark>').replace(_MARK_END, '</mark>')
+    return {
+        "results": rows,
+        "next_before_id": rows[-1]['id'] if has_more and order != 'rank' else None,
+        "has_more": has_more
+    }
+
+# Order of Twilio call statuses, used so that callbacks arriving out of
+# order never move a call back. Terminal statuses (completed, busy, failed,
+# no-answer, canceled) all rank highest.
+CALL_STATUS_RANKS = {'queued': 0, 'initiated': 1, 'ringing': 2, 'in-progress': 3, 'stale': 3}
+TERMINAL_STATUS_RANK = 4
+
+def call_status_rank(status):
+    return CALL_STATUS_RANKS.get(status, TERMINAL_STATUS_RANK)
+
+def create_call(call_sid, caller_number):
+    """Create a new call record in the database, or take over the one a status callback created"""
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        now = datetime.now()
+        try:
+            cursor.execute(
+                "INSERT INTO calls (call_sid, start_time, status, caller_number) VALUES (?, ?, ?, ?)",
+                (call_sid, now, "in-progress", caller_number)
+            )
+            call_id = cursor.lastrowid
+            previous_status = None
+        except sqlite3.IntegrityError:
+            # Twilio status callbacks (see call_status.py) can create the row first
+            cursor.execute("SELECT id, status FROM calls WHERE call_sid = ?", (call_sid,))
+            row = cursor.fetchone()
+            call_id, previous_status = row["id"], row["status"]
+            if call_status_rank(previous_status) < call_status_rank("in-progress"):
+                cursor.execute(
+                    "UPDATE calls SET status = 'in-progress', caller_number = COALESCE(caller_number, ?) WHERE id = ?",
+                    (caller_number, call_id)
+                )
         conn.commit()
-        db_logger.info(f"Created new call record with ID: {call_id}")
+        db_logger.info("Created new call record with ID: %s", call_id)
+        if previous_status is None:
+            event_bus.publish("call_created", {
+                "id": call_id,
+                "call_sid": call_sid,
+                "start_time": now,
+                "status": "in-progress",
+                "caller_number": caller_number
+            })
+        elif call_status_rank(previous_status) < call_status_rank("in-progress"):
+            event_bus.publish("call_status", {
+                "id": call_id,
+                "status": "in-progress",
+                "previous_status": previous_status,
+                "end_time": None,
+                "call_duration": None
+            })
         return call_id
     except Exception as e:
         db_logger.error(f"Error creating call record: {str(e)}")
@@ -94,11 +485,119 @@ def create_call(call_sid, caller_number):
     finally:
         conn.close()
 
+def apply_call_status_updates(updates):
+    """
+    Apply a batch of call status changes in one transaction.
+
+    Calls the database doesn't know yet, such as outbound calls that were
+    never answered, are created. A change never moves a call back to an
+    earlier status.
+
+    Args:
+        updates: Dicts with call_sid, status, timestamp, duration and
+            caller_number (duration and caller_number may be None)
+
+    Returns:
+        int: Number of calls created or changed
+    """
+    events = []
+    conn = get_db_connection()
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        cursor = conn.cursor()
+
+        existing = {}
+        call_sids = [update["call_sid"] for update in updates]
+        for start in range(0, len(call_sids), 500):
+            chunk = call_sids[start:start + 500]
+            cursor.execute(
+                f"SELECT id, call_sid, status FROM calls WHERE call_sid IN ({','.join('?' * len(chunk))})",
+                chunk
+            )
+            existing.update({row["call_sid"]: row for row in cursor.fetchall()})
+
+        for update in updates:
+            status = update["status"]
+            end_time = update["timestamp"] if call_status_rank(status) >= TERMINAL_STATUS_RANK else None
+            row = existing.get(update["call_sid"])
+            if row is None:
+                cursor.execute(
+                    "INSERT INTO calls (call_sid, start_time, end_time, status, caller_number, call_duration) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (update["call_sid"], update["timestamp"], end_time, status,
+                     update["caller_number"], update["duration"])
+                )
+                events.append(("call_created", {
+                    "id": cursor.lastrowid,
+                    "call_sid": update["call_sid"],
+                    "start_time": update["timestamp"],
+                    "status": status,
+                    "caller_number": update["caller_number"]
+                }))
+                continue
+
+            advanced = call_status_rank(status) > call_status_rank(row["status"])
+            if not advanced and not (status == row["status"] and update["duration"] is not None):
+                continue
+            cursor.execute(
+                "UPDATE calls SET status = ?, end_time = COALESCE(?, end_time), "
+                "call_duration = COALESCE(?, call_duration) WHERE id = ?",
+                (status, end_time, update["duration"], row["id"])
+            )
+            events.append(("call_status", {
+                "id": row["id"],
+                "status": status,
+                "previous_status": row["status"],
+                "end_time": end_time,
+                "call_duration": update["duration"]
+            }))
+        conn.commit()
+    except Exception as e:
+        db_logger.error(f"Error applying call status updates: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+    for event_type, data in events:
+        event_bus.publish(event_type, data)
+    db_logger.info("Applied %d call status updates (%d changed)", len(updates), len(events))
+    return len(events)
+
+def expire_stale_calls(max_age_s):
+    """
+    Mark calls as 'stale' that started more than max_age_s seconds ago but
+    never reached a final status, e.g. because no callback arrived.
+
+    Returns:
+        int: Number of calls marked stale
+    """
+    active = [status for status in CALL_STATUS_RANKS if status != 'stale']
+    cutoff = datetime.now() - timedelta(seconds=max_age_s)
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"UPDATE calls SET status = 'stale' WHERE status IN ({','.join('?' * len(active))}) AND start_time < ?",
+            active + [cutoff]
+        )
+        conn.commit()
+        if cursor.rowcount:
+            db_logger.warning("Marked %d calls stale", cursor.rowcount)
+        return cursor.rowcount
+    except Exception as e:
+        db_logger.error(f"Error expiring stale calls: {str(e)}")
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
 def update_call_status(call_id, status, duration=None):
     """Update call status and optionally duration"""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
+        now = None
         if status == "completed":
             now = datetime.now()
             cursor.execute(
@@ -111,26 +610,40 @@ def update_call_status(call_id, status, duration=None):
                 (status, call_id)
             )
         conn.commit()
-        db_logger.info(f"Updated call {call_id} status to {status}")
+        db_logger.info("Updated call %s status to %s", call_id, status)
+        event_bus.publish("call_status", {
+            "id": call_id,
+            "status": status,
+            "end_time": now,
+            "call_duration": duration if now else None
+        })
     except Exception as e:
         db_logger.error(f"Error updating call status: {str(e)}")
         conn.rollback()
     finally:
         conn.close()
 
-def add_conversation_entry(call_id, role, content):
-    """Add a conversation entry (user input or assistant response)"""
+def add_conversation_entry(call_id, role, content, intent=None):
+    """Add a conversation entry (user input or assistant response), optionally tagged with an intent"""
     conn = get_db_connection()
     try:
         cursor = conn.cursor()
         now = datetime.now()
         cursor.execute(
-            "INSERT INTO conversation_entries (call_id, timestamp, role, content) VALUES (?, ?, ?, ?)",
-            (call_id, now, role, content)
+            "INSERT INTO conversation_entries (call_id, timestamp, role, content, intent) VALUES (?, ?, ?, ?, ?)",
+            (call_id, now, role, content, intent)
         )
         entry_id = cursor.lastrowid
         conn.commit()
-        db_logger.info(f"Added conversation entry {entry_id} for call {call_id}")
+        db_logger.info("Added conversation entry %s for call %s", entry_id, call_id)
+        event_bus.publish("transcript", {
+            "id": entry_id,
+            "call_id": call_id,
+            "timestamp": now,
+            "role": role,
+            "content": content,
+            "intent": intent
+        })
         return entry_id
     except Exception as e:
         db_logger.error(f"Error adding conversation entry: {str(e)}")
@@ -152,7 +665,14 @@ def add_performance_metric(call_id, step_name, start_time, end_time, metadata=No
         )
         metric_id = cursor.lastrowid
         conn.commit()
-        db_logger.info(f"Added performance metric {metric_id} for call {call_id}: {step_name} took {duration_ms}ms")
+        db_logger.info("Added performance metric %s for call %s: %s took %sms", metric_id, call_id, step_name, duration_ms)
+        event_bus.publish("metric", {
+            "id": metric_id,
+            "call_id": call_id,
+            "step_name": step_name,
+            "start_time": start_time,
+            "duration_ms": duration_ms
+        })
         return metric_id
     except Exception as e:
         db_logger.error(f"Error adding performance metric: {str(e)}")
@@ -208,6 +728,61 @@ def get_call_details(call_id):
     finally:
         conn.close()
 
+def get_transcripts(limit=None, status=None, date_from=None, date_to=None):
+    """
+    Get recorded conversations for offline replay, oldest call first.
+
+    Args:
+        limit: Maximum number of calls
+        status: Only calls with this status, e.g. 'completed'
+        date_from: Only calls started at or after this date
+        date_to: Only calls started before this date
+
+    Returns:
+        list: Dicts with call_id, call_sid and entries ({role, content, intent}) in order
+    """
+    conditions = []
+    params = []
+    if status:
+        conditions.append("status = ?")
+        params.append(status)
+    if date_from:
+        conditions.append("start_time >= ?")
+        params.append(date_from)
+    if date_to:
+        conditions.append("start_time < ?")
+        params.append(date_to)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    if limit:
+        params.append(limit)
+
+    conn = get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute(
+            f"""
+            WITH selected AS (
+                SELECT id, call_sid FROM calls {where}
+                ORDER BY id {"LIMIT ?" if limit else ""}
+            )
+            SELECT selected.id AS call_id, selected.call_sid, e.role, e.content, e.intent
+            FROM selected
+            JOIN conversation_entries e ON e.call_id = selected.id
+            ORDER BY selected.id, e.id
+            """,
+            params
+        )
+        transcripts = []
+        for row in cursor:
+            if not transcripts or transcripts[-1]["call_id"] != row["call_id"]:
+                transcripts.append({"call_id": row["call_id"], "call_sid": row["call_sid"], "entries": []})
+            transcripts[-1]["entries"].append(
+                {"role": row["role"], "content": row["content"], "intent": row["intent"]}
+            )
+        return transcripts
+    finally:
+        conn.close()
+
 def get_performance_statistics():
     """Get aggregated performance statistics"""
     conn = get_db_connection()
@@ -231,5 +806,40 @@ def get_performance_statistics():
     finally:
         conn.close()
 
-# Initialize database when module is imported
-init_db()
+def get_voice_statistics(since=None):
+    """
+    Get TTS latency and throughput per voice (the "voice" of tts_processing metrics)
+    
+    Args:
+        since: Only count requests started at or after this datetime
+    
+    Returns:
+        list: One dict per voice, busiest first
+    """
+    conn = get_db_connection()
+    try:
+        query = """
+            SELECT
+                json_extract(metadata, '$.voice') as voice,
+                COUNT(*) as count,
+                AVG(duration_ms) as avg_duration,
+                MIN(duration_ms) as min_duration,
+                MAX(duration_ms) as max_duration,
+                AVG(json_extract(metadata, '$.first_byte_ms')) as avg_first_byte_ms,
+                SUM(json_extract(metadata, '$.text_length')) as characters,
+                SUM(json_extract(metadata, '$.audio_bytes')) as audio_bytes,
+                MIN(start_time) as first_request,
+                MAX(end_time) as last_request
+            FROM performance_metrics
+            WHERE step_name = 'tts_processing'
+        """
+        params = []
+        if since is not None:
+            query += " AND start_time >= ?"
+            params.append(since)
+        query += " GROUP BY voice ORDER BY count DESC"
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return [dict(row) for row in cursor.fetchall()]
+    finally:
+        conn.close()
@@ -0,0 +1,44 @@
+import os
+import threading
+
+# Default per-turn latency budgets in milliseconds
+DEFAULT_BUDGETS_MS = {
+    "llm": 3000,
+    "tts": 2000,
+}
+
+
+class TurnBudgets:
+    """
+    Per-stage latency budgets for a call turn, with counters of how often
+    each stage missed its budget.
+
+    Budgets can be overridden with LLM_BUDGET_MS and TTS_BUDGET_MS.
+    """
+
+    def __init__(self, budgets_ms=None):
+        self.budgets_ms = dict(DEFAULT_BUDGETS_MS)
+        for stage in self.budgets_ms:
+            value = os.getenv(f"{stage.upper()}_BUDGET_MS")
+            if value:
+                self.budgets_ms[stage] = int(value)
+        if budgets_ms:
+            self.budgets_ms.update(budgets_ms)
+
+        self.misses = {stage: 0 for stage in self.budgets_ms}
+        self.lock = threading.Lock()
+
+    def seconds(self, stage):
+        """Budget of a stage in seconds, for Future.result(timeout=...)"""
+        return self.budgets_ms[stage] / 1000
+
+    def record_miss(self, stage):
+        with self.lock:
+            self.misses[stage] = self.misses.get(stage, 0) + 1
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "budgets_ms": dict(self.budgets_ms),
+                "misses": dict(self.misses),
+            }
@@ -0,0 +1,51 @@
+import json
+import threading
+from collections import deque
+
+
+class EventBus:
+    """
+    In-process publish/subscribe bus for dashboard updates.
+
+    Events are kept in a bounded ring buffer with increasing IDs. Subscribers
+    don't get their own queues; each one just remembers the last event ID it
+    has seen and waits on a shared condition, so publishing costs the same no
+    matter how many dashboards are open, and a reconnecting client can resume
+    from its Last-Event-ID without touching the database.
+    """
+
+    def __init__(self, history=1000):
+        self.events = deque(maxlen=history)
+        self.last_id = 0
+        self.condition = threading.Condition()
+
+    def publish(self, event_type, data):
+        """Publish an event to all subscribers"""
+        with self.condition:
+            self.last_id += 1
+            self.events.append((self.last_id, event_type, data))
+            self.condition.notify_all()
+            return self.last_id
+
+    def events_since(self, last_id):
+        """Events published after last_id that are still in the buffer"""
+        with self.condition:
+            return [event for event in self.events if event[0] > last_id]
+
+    def wait(self, last_id, timeout):
+        """
+        Block until an event newer than last_id is published or timeout
+        seconds pass, then return the new events (possibly none).
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.last_id > last_id, timeout)
+            return [event for event in self.events if event[0] > last_id]
+
+
+def format_sse(event_id, event_type, data):
+    """Serialize an event in the text/event-stream wire format"""
+    return f"id: {event_id}\nevent: {event_type}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+# Shared bus for the whole process
+event_bus = EventBus()
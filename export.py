@@ -0,0 +1,203 @@
+import csv
+import io
+import zlib
+import database as db
+from logger import setup_logger
+
+# pyarrow is optional; without it only compressed CSV is available. It is
+# imported on the first columnar export, since it is slow to import.
+pa = None
+
+export_logger = setup_logger('export', 'export.log')
+
+# Column types of the exportable tables, used for the Arrow/Parquet schemas
+EXPORT_TABLES = {
+    "calls": [
+        ("id", "int64"), ("call_sid", "string"), ("start_time", "string"),
+        ("end_time", "string"), ("status", "string"), ("caller_number", "string"),
+        ("call_duration", "int64"),
+    ],
+    "conversation_entries": [
+        ("id", "int64"), ("call_id", "int64"), ("timestamp", "string"),
+        ("role", "string"), ("content", "string"), ("intent", "string"),
+    ],
+    "performance_metrics": [
+        ("id", "int64"), ("call_id", "int64"), ("step_name", "string"),
+        ("start_time", "string"), ("end_time", "string"), ("duration_ms", "int64"),
+        ("metadata", "string"),
+    ],
+}
+
+EXPORT_FORMATS = {
+    "csv.gz": "application/gzip",
+    "arrow": "application/vnd.apache.arrow.stream",
+    "parquet": "application/vnd.apache.parquet",
+}
+
+BATCH_SIZE = 5000
+
+
+def iter_batches(table, since_id=0, until_id=None, batch_size=BATCH_SIZE):
+    """
+    Yield lists of row tuples with since_id < id <= until_id in id order.
+
+    Uses keyset pagination with a fresh short read per batch, so memory stays
+    flat and no read transaction is held open for the whole export.
+    """
+    columns = [name for name, _ in EXPORT_TABLES[table]]
+    query = f"SELECT {', '.join(columns)} FROM {table} WHERE id > ? AND id <= ? ORDER BY id LIMIT ?"
+    if until_id is None:
+        until_id = max_id(table)
+    last_id = since_id
+    while True:
+        conn = db.get_db_connection()
+        try:
+            rows = [tuple(row) for row in conn.execute(query, (last_id, until_id, batch_size))]
+        finally:
+            conn.close()
+        if not rows:
+            return
+        yield rows
+        last_id = rows[-1][0]
+        if len(rows) < batch_size:
+            return
+
+
+def _csv_gz(table, batches):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # 31 = gzip container
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([name for name, _ in EXPORT_TABLES[table]])
+    for rows in batches:
+        writer.writerows(rows)
+        data = compressor.compress(buffer.getvalue().encode('utf-8'))
+        buffer.seek(0)
+        buffer.truncate()
+        if data:
+            yield data
+    yield compressor.compress(buffer.getvalue().encode('utf-8')) + compressor.flush()
+
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file object that hands written bytes to a generator"""
+
+    def __init__(self):
+        self.chunks = []
+        self.position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.chunks.append(bytes(data))
+        self.position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self.position
+
+    def drain(self):
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def _load_pyarrow():
+    """Import pyarrow on first use. Returns False if it isn't installed."""
+    global pa
+    if pa is None:
+        try:
+            import pyarrow
+            import pyarrow.ipc
+            import pyarrow.parquet
+        except ImportError:
+            return False
+        pa = pyarrow
+    return True
+
+
+def _arrow_schema(table):
+    return pa.schema([(name, getattr(pa, type_name)()) for name, type_name in EXPORT_TABLES[table]])
+
+
+def _columnar(table, batches, file_format):
+    schema = _arrow_schema(table)
+    sink = _ChunkSink()
+    if file_format == "parquet":
+        writer = pa.parquet.ParquetWriter(sink, schema, compression="zstd")
+    else:
+        writer = pa.ipc.new_stream(sink, schema)
+    names = schema.names
+    for rows in batches:
+        columns = list(zip(*rows))
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(list(col), type=schema.field(i).type) for i, col in enumerate(columns)],
+            names=names
+        )
+        writer.write_batch(batch)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    yield sink.drain()
+
+
+def export_table(table, file_format="csv.gz", since_id=0, until_id=None, batch_size=BATCH_SIZE):
+    """
+    Stream a table export as bytes chunks.
+
+    Rows are selected by id, so incremental exports pick up new rows but not
+    later updates to already exported calls (e.g. status changes).
+
+    Args:
+        table: One of EXPORT_TABLES
+        file_format: "csv.gz", or "arrow" / "parquet" when pyarrow is installed
+        since_id: Only export rows with a larger id (incremental exports)
+        until_id: Only export rows up to this id, defaults to the current maximum
+
+    Raises:
+        ValueError: For unknown tables or formats that aren't available
+    """
+    if table not in EXPORT_TABLES:
+        raise ValueError(f"Unknown table: {table}")
+    if file_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {file_format}")
+    if file_format != "csv.gz" and not _load_pyarrow():
+        raise ValueError(f"Format {file_format} requires pyarrow to be installed")
+
+    export_logger.info(f"Exporting {table} as {file_format}, ids {since_id}-{until_id or 'max'}")
+    batches = iter_batches(table, since_id, until_id, batch_size)
+    if file_format == "csv.gz":
+        return _csv_gz(table, batches)
+    return _columnar(table, batches, file_format)
+
+
+def get_watermark(table):
+    """Highest id exported by the last incremental export of a table"""
+    conn = db.get_db_connection()
+    try:
+        row = conn.execute("SELECT last_id FROM export_watermarks WHERE table_name = ?", (table,)).fetchone()
+        return row['last_id'] if row else 0
+    finally:
+        conn.close()
+
+
+def set_watermark(table, last_id):
+    conn = db.get_db_connection()
+    try:
+        conn.execute(
+            "INSERT OR REPLACE INTO export_watermarks (table_name, last_id) VALUES (?, ?)",
+            (table, last_id)
+        )
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def max_id(table):
+    """Current highest id of a table (cheap: uses the primary key index)"""
+    conn = db.get_db_connection()
+    try:
+        return conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+    finally:
+        conn.close()
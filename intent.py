@@ -0,0 +1,165 @@
+import re
+from logger import setup_logger
+
+intent_logger = setup_logger('intent', 'intent.log')
+
+# Objection/answer pairs in playbook content:
+#   "Liian kallista"
+#   → "Tarjoushintamme on vain 1,50 euroa viikossa"
+OBJECTION_PATTERN = re.compile(r'^"(?P<objection>[^"]+)"\s*\n\s*→\s*"(?P<reply>[^"]+)"', re.MULTILINE)
+
+# Fraction of a phrase's words that must be heard for it to match
+MIN_SCORE = 0.5
+# Default minimum score for answering an objection with its scripted reply
+SCRIPTED_REPLY_MIN_SCORE = 0.75
+
+# Negation particles. They aren't matched as phrase words; instead a phrase
+# only matches when it is negated the same way in the utterance, so "se ei
+# ole liian kallista" doesn't match "liian kallista"
+NEGATIONS = {
+    "ei", "en", "et", "emme", "ette", "eivät", "eikä", "enkä", "etkä", "emmekä", "ettekä", "eivätkä",
+    "älä", "älkää", "not", "don", "dont", "never",
+}
+NEGATION_PATTERN = re.compile(r'\b(?:' + '|'.join(sorted(NEGATIONS, key=len, reverse=True)) + r')\b')
+# Negation reaches up to the end of the clause
+CLAUSE_PATTERN = re.compile(r'[^,.;:!?]+')
+
+# Function words that say nothing about the intent and would otherwise let
+# any sentence with "ole" or "minulla" score on a phrase
+STOPWORDS = {
+    "ole", "olen", "olet", "on", "olemme", "olette", "ovat", "olla", "ollut", "oli", "olisi",
+    "minä", "mä", "sinä", "sä", "hän", "me", "te", "he", "se", "ne", "tämä", "tuo", "nämä",
+    "minulla", "sinulla", "meillä", "minua", "minulle", "mitään", "mikään",
+    "ja", "tai", "mutta", "että", "kun", "jos", "nyt", "vain", "myös", "niin", "jo", "vielä", "kuin",
+    "the", "a", "an", "is", "are", "i", "you", "it", "to", "of", "and", "or",
+}
+
+
+def word_stem(word):
+    """
+    Crude stem for matching inflected forms: long words match any word
+    starting with their first letters ("kallista" -> "kalli", matching
+    "kallis" and "kalliimpi"), short words must match exactly.
+    """
+    if len(word) <= 4:
+        return word, False
+    return word[:max(4, len(word) - 3)], True
+
+
+class IntentClassifier:
+    """
+    Keyword classifier tagging caller utterances with an intent, without an
+    LLM round-trip.
+
+    Phrases come from the playbook: every objection in its "X" → "Y" pairs
+    becomes an intent with Y as the scripted reply, and the optional
+    "intents" dict adds phrase lists for other outcomes (sale, hang-up...).
+    All phrase words are compiled into one regex, so an utterance is
+    classified in a single scan.
+
+    Stopwords and negation particles aren't phrase words. A phrase containing
+    a negation ("ei kiitos") only matches words heard after a negation in the
+    same clause, any other phrase only words heard without one.
+    """
+
+    def __init__(self, playbook=None):
+        playbook = playbook or {}
+        self.phrases = []  # (intent, set of stems, negated)
+        self.replies = {}
+
+        for match in OBJECTION_PATTERN.finditer(playbook.get("content", "")):
+            name = "objection:" + re.sub(r'\W+', '_', match.group("objection").lower()).strip('_')
+            self.replies[name] = match.group("reply").strip()
+            self._add_phrase(name, match.group("objection"))
+        for name, phrases in playbook.get("intents", {}).items():
+            for phrase in phrases:
+                self._add_phrase(name, phrase)
+
+        # Playbooks opt in to answering objections without the LLM
+        self.scripted_replies = playbook.get("scripted_replies", False)
+        self.scripted_reply_min_score = playbook.get("scripted_reply_min_score", SCRIPTED_REPLY_MIN_SCORE)
+        self._compile()
+        intent_logger.info(f"Intent classifier built with {len(self.phrases)} phrases, {len(self.stems)} stems")
+
+    def _add_phrase(self, name, phrase):
+        words = re.findall(r'\w+', phrase.lower())
+        negated = any(word in NEGATIONS for word in words)
+        stems = {word_stem(word) for word in words if word not in NEGATIONS and word not in STOPWORDS}
+        if stems:
+            self.phrases.append((name, stems, negated))
+
+    def _compile(self):
+        self.stems = sorted({stem for _, stems, _ in self.phrases for stem in stems}, key=lambda s: -len(s[0]))
+        if not self.stems:
+            self.regex = None
+            return
+
+        # Longest stems first, so a word matches the most specific stem; the
+        # shorter prefixes of that stem are credited via self.implied
+        alternatives = []
+        for i, (stem, is_prefix) in enumerate(self.stems):
+            suffix = r'\w*' if is_prefix else ''
+            alternatives.append(f"(?P<s{i}>{re.escape(stem)}{suffix})")
+        self.regex = re.compile(r'\b(?:' + '|'.join(alternatives) + r')\b')
+
+        self.implied = {}
+        for i, (stem, _) in enumerate(self.stems):
+            self.implied[f"s{i}"] = {
+                (other, other_prefix) for other, other_prefix in self.stems
+                if other == stem or (other_prefix and stem.startswith(other))
+            }
+
+        self.by_stem = {}
+        for index, (_, stems, _) in enumerate(self.phrases):
+            for stem in stems:
+                self.by_stem.setdefault(stem, []).append(index)
+
+    def classify(self, text):
+        """
+        Classify an utterance.
+
+        Args:
+            text: What the caller said (Twilio SpeechResult)
+
+        Returns:
+            dict: {"intent", "score", "reply"} for the best matching phrase,
+            where reply is the scripted answer for objections (else None),
+            or None if nothing matched
+        """
+        if not text or self.regex is None:
+            return None
+
+        # Stems heard without and after a negation
+        heard = {False: set(), True: set()}
+        for clause in CLAUSE_PATTERN.finditer(text.lower()):
+            clause = clause.group()
+            negation = NEGATION_PATTERN.search(clause)
+            for match in self.regex.finditer(clause):
+                negated = negation is not None and negation.start() < match.start()
+                heard[negated] |= self.implied[match.lastgroup]
+        if not heard[False] and not heard[True]:
+            return None
+
+        best = None
+        for index in {i for stems in heard.values() for stem in stems for i in self.by_stem[stem]}:
+            name, stems, negated = self.phrases[index]
+            matched = len(stems & heard[negated])
+            # Single heard words only count for single word phrases
+            if matched < min(2, len(stems)):
+                continue
+            score = matched / len(stems)
+            if score >= MIN_SCORE and (best is None or (score, matched) > best[:2]):
+                best = (score, matched, name)
+
+        if best is None:
+            return None
+        score, _, name = best
+        return {"intent": name, "score": round(score, 2), "reply": self.replies.get(name)}
+
+    def scripted_reply(self, result):
+        """Scripted reply for a classification result, if it is confident enough to skip the LLM"""
+        if not self.scripted_replies or not result or not result["reply"]:
+            return None
+        if result["score"] >= self.scripted_reply_min_score:
+            return result["reply"]
+        return None
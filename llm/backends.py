@@ -0,0 +1,145 @@
+import os
+import logging
+import json
+import time
+import random
+import requests
+
+# Shares llm_interactions.log with llm/client.py, which sets the logger up
+llm_logger = logging.getLogger('llm_interactions')
+
+# (connect, read) timeouts for OpenRouter; the read timeout bounds the gap
+# between streamed chunks rather than the whole completion
+REQUEST_TIMEOUT = (3.05, 15)
+
+
+class BackendError(Exception):
+    """Raised when a backend fails to produce a completion"""
+
+
+class OpenRouterBackend:
+    """Streams chat completions from OpenRouter."""
+
+    def __init__(self, api_key):
+        self.api_key = api_key
+        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+
+    def complete(self, model, messages, max_tokens, cancel_token=None):
+        """
+        Request a completion from the given model.
+
+        Returns:
+            tuple: (text, number of content chunks received). The text is
+            partial if cancel_token was cancelled while streaming.
+        """
+        headers = {
+            "Content-Type": "application/json",
+            "Authorization": f"Bearer {self.api_key}"
+        }
+
+        data = {
+            "model": model,
+            "messages": messages,
+            "max_tokens": max_tokens,
+            "stream": True
+        }
+
+        response = requests.post(
+            self.base_url,
+            headers=headers,
+            data=json.dumps(data),
+            stream=True,
+            timeout=REQUEST_TIMEOUT
+        )
+        if response.status_code != 200:
+            response.close()
+            raise BackendError(f"OpenRouter returned {response.status_code} for {model}")
+
+        text, received_tokens = self._read_stream(response, cancel_token)
+        if not text and not (cancel_token is not None and cancel_token.cancelled):
+            raise BackendError(f"Empty completion from {model}")
+        return text, received_tokens
+
+    def _read_stream(self, response, cancel_token=None):
+        """
+        Collect the content deltas of an OpenRouter server-sent event stream.
+
+        Returns:
+            tuple: (text, number of content chunks received). Stops early and
+            closes the connection if cancel_token is cancelled.
+        """
+        parts = []
+        received_tokens = 0
+        try:
+            for line in response.iter_lines(decode_unicode=True):
+                if cancel_token is not None and cancel_token.cancelled:
+                    llm_logger.info("LLM stream cancelled after %d chunks", received_tokens)
+                    break
+                # Skip keep-alive comments and blank separators
+                if not line or not line.startswith("data:"):
+                    continue
+                payload = line[len("data:"):].strip()
+                if payload == "[DONE]":
+                    break
+                chunk = json.loads(payload)
+                if "error" in chunk:
+                    raise BackendError(f"OpenRouter stream error: {chunk['error']}")
+                choices = chunk.get("choices") or []
+                if choices:
+                    delta = choices[0].get("delta", {}).get("content")
+                    if delta:
+                        parts.append(delta)
+                        received_tokens += 1
+        finally:
+            response.close()
+        return "".join(parts), received_tokens
+
+
+class StubBackend:
+    """
+    Local backend for development and testing that answers with a canned reply
+    after a simulated, per-model latency.
+
+    Profiles map a model name to a dict with "latency_ms" (mean), "jitter_ms"
+    and "error_rate". Models without a profile use the "default" profile.
+    """
+
+    DEFAULT_PROFILES = {
+        "default": {"latency_ms": 300, "jitter_ms": 100, "error_rate": 0.0},
+    }
+
+    def __init__(self, profiles=None, reply="Hei, täällä Marja Me Naiset -lehdestä. Soitinko huonoon aikaan?"):
+        self.profiles = dict(self.DEFAULT_PROFILES)
+        if profiles:
+            self.profiles.update(profiles)
+        self.reply = reply
+
+    def complete(self, model, messages, max_tokens, cancel_token=None):
+        profile = self.profiles.get(model, self.profiles["default"])
+        latency = max(random.gauss(profile["latency_ms"], profile.get("jitter_ms", 0)), 0) / 1000
+
+        # Sleep in small steps so cancellation is honoured like a real stream
+        deadline = time.monotonic() + latency
+        while time.monotonic() < deadline:
+            if cancel_token is not None and cancel_token.cancelled:
+                return "", 0
+            time.sleep(min(0.01, max(deadline - time.monotonic(), 0)))
+
+        if random.random() < profile.get("error_rate", 0.0):
+            raise BackendError(f"Simulated failure from {model}")
+
+        words = self.reply.split()[:max_tokens]
+        return " ".join(words), len(words)
+
+
+def create_backend(api_key=None, name=None):
+    """
+    Create the backend selected by name or the LLM_BACKEND environment
+    variable ("openrouter" by default, or "stub"). Stub latency profiles can
+    be given as JSON in LLM_STUB_PROFILES.
+    """
+    backend = (name or os.getenv('LLM_BACKEND', 'openrouter')).lower()
+    if backend == 'stub':
+        profiles = os.getenv('LLM_STUB_PROFILES')
+        return StubBackend(json.loads(profiles) if profiles else None)
+    return OpenRouterBackend(api_key)
@@ -0,0 +1,189 @@
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+
+# Minimum trigram similarity for reusing the reply to a different utterance.
+# 1.0 only reuses replies to the same utterance; playbooks opt in to
+# approximate matching with a lower "response_cache_threshold"
+DEFAULT_THRESHOLD = 1.0
+DEFAULT_MAX_ENTRIES = 2000
+
+# Numbers, emails and web addresses: the caller's own details. Utterances
+# containing them only match exactly, since "15 B 12" and "16 B 12" differ
+# by one trigram
+ENTITY_PATTERN = re.compile(r'\d|@|\bwww\.|https?://')
+# Capitalized words after the first one are names (people, streets, towns)
+PROPER_NOUN_PATTERN = re.compile(r'(?<=\s)[A-ZÅÄÖ]\w+')
+
+
+def normalize(text):
+    """Lowercase, strip punctuation and collapse whitespace"""
+    text = unicodedata.normalize('NFC', text or "").lower()
+    return " ".join(re.findall(r'\w+', text))
+
+
+def has_entities(text):
+    """Whether an utterance contains caller details that shouldn't be matched approximately"""
+    return bool(ENTITY_PATTERN.search(text or ""))
+
+
+def echoes_caller(utterance, reply):
+    """
+    Whether a reply repeats the caller's details back ("Kiitos, eli
+    Mannerheimintie 15 B 12"): numbers, emails and names of the utterance.
+    Such a reply is only right for this caller.
+    """
+    utterance = utterance or ""
+    details = {word for word in normalize(utterance).split() if has_entities(word)}
+    details |= {word.lower() for word in PROPER_NOUN_PATTERN.findall(utterance)}
+    details |= {word for word in re.findall(r'\S+@\S+', utterance.lower())}
+    if not details:
+        return False
+    reply_words = set(normalize(reply).split()) | set(re.findall(r'\S+@\S+', (reply or "").lower()))
+    return bool(details & reply_words)
+
+
+def trigrams(text):
+    padded = f" {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ResponseCache:
+    """
+    Cache of LLM replies keyed on (playbook, conversation state, utterance).
+
+    The conversation state is the normalized previous assistant message, i.e.
+    the point of the script the caller is answering. Utterances are matched
+    exactly first, then, with a threshold below 1.0, approximately by
+    character trigram similarity using an inverted index per state, so at
+    0.8 "mulla ei ole aikaa lukea lehtiä" can reuse the reply to "minulla ei
+    ole aikaa lukea lehtiä".
+
+    Utterances with numbers or emails are only matched exactly, and replies
+    repeating the caller's details back aren't cached at all.
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD, max_entries=DEFAULT_MAX_ENTRIES):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.entries = OrderedDict()  # (playbook, state, utterance) -> entry, in LRU order
+        self.index = {}  # (playbook, state) -> trigram -> set of utterances
+        self.audio = {}  # reply -> audio ID of its rendered speech
+        self.reply_counts = {}  # reply -> number of entries with it
+        self.stats = {"hits": 0, "approximate_hits": 0, "misses": 0, "saved_ms": 0}
+        self.lock = threading.Lock()
+
+    def get(self, playbook, state, utterance):
+        """
+        Look up a cached reply.
+
+        Returns:
+            dict: {"reply", "similarity", "saved_ms"} or None on a miss
+        """
+        exact_only = self.threshold >= 1.0 or has_entities(utterance)
+        utterance = normalize(utterance)
+        partition = (playbook, normalize(state))
+        with self.lock:
+            key = partition + (utterance,)
+            similarity = 1.0
+            if key not in self.entries:
+                key, similarity = (None, 0.0) if exact_only else self._closest(partition, utterance)
+            if key is None:
+                self.stats["misses"] += 1
+                return None
+
+            self.entries.move_to_end(key)
+            entry = self.entries[key]
+            self.stats["hits"] += 1
+            if similarity < 1.0:
+                self.stats["approximate_hits"] += 1
+            self.stats["saved_ms"] += entry["latency_ms"]
+            return {"reply": entry["reply"], "similarity": round(similarity, 3), "saved_ms": entry["latency_ms"]}
+
+    def _closest(self, partition, utterance):
+        index = self.index.get(partition)
+        grams = trigrams(utterance)
+        if not index or not grams:
+            return None, 0.0
+
+        shared = {}
+        for gram in grams:
+            for candidate in index.get(gram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        best, best_similarity = None, 0.0
+        for candidate, count in shared.items():
+            # Jaccard similarity of the trigram sets
+            similarity = count / (len(grams) + len(self.entries[partition + (candidate,)]["grams"]) - count)
+            if similarity > best_similarity:
+                best, best_similarity = candidate, similarity
+        if best_similarity < self.threshold:
+            return None, 0.0
+        return partition + (best,), best_similarity
+
+    def put(self, playbook, state, utterance, reply, latency_ms):
+        """
+        Cache the reply the LLM gave to an utterance, with how long it took.
+        Replies repeating the caller's details back aren't cached.
+        """
+        if echoes_caller(utterance, reply):
+            return
+        # Utterances with caller details are kept out of the approximate index
+        indexed = self.threshold < 1.0 and not has_entities(utterance)
+        utterance = normalize(utterance)
+        partition = (playbook, normalize(state))
+        key = partition + (utterance,)
+        with self.lock:
+            if key in self.entries:
+                self._remove(key)
+            grams = trigrams(utterance) if indexed else set()
+            self.entries[key] = {"reply": reply, "latency_ms": int(latency_ms), "grams": grams}
+            self.reply_counts[reply] = self.reply_counts.get(reply, 0) + 1
+            if grams:
+                index = self.index.setdefault(partition, {})
+                for gram in grams:
+                    index.setdefault(gram, set()).add(utterance)
+            while len(self.entries) > self.max_entries:
+                self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        partition, utterance = key[:2], key[2]
+        if entry["grams"]:
+            index = self.index[partition]
+            for gram in entry["grams"]:
+                utterances = index.get(gram)
+                if utterances is not None:
+                    utterances.discard(utterance)
+                    if not utterances:
+                        del index[gram]
+            if not index:
+                del self.index[partition]
+        self.reply_counts[entry["reply"]] -= 1
+        if not self.reply_counts[entry["reply"]]:
+            del self.reply_counts[entry["reply"]]
+            self.audio.pop(entry["reply"], None)
+
+    def get_audio(self, reply):
+        """Audio ID of a cached reply's speech, if it was rendered"""
+        return self.audio.get(reply)
+
+    def set_audio(self, reply, audio_id):
+        """Remember rendered speech for a reply; ignored for replies that aren't cached"""
+        with self.lock:
+            if reply in self.reply_counts:
+                self.audio[reply] = audio_id
+
+    def clear_audio(self):
+        with self.lock:
+            self.audio = {}
+
+    def snapshot(self):
+        with self.lock:
+            lookups = self.stats["hits"] + self.stats["misses"]
+            return {
+                "entries": len(self.entries),
+                "hit_rate": round(self.stats["hits"] / lookups, 3) if lookups else None,
+                **self.stats
+            }
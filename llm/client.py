@@ -1,27 +1,44 @@
 import os
-import json
-import requests
+from contextlib import nullcontext
 from datetime import datetime
-from dotenv import load_dotenv
+from config import load_env
 from logger import setup_logger
 from typing import Optional, Dict, Any, List
 from timing import measure_time
+from llm.backends import create_backend, OpenRouterBackend
+from llm.router import ModelRouter
+from llm.cache import ResponseCache, DEFAULT_THRESHOLD
+from admission import PRIORITY_ONGOING, SlotUnavailable
 
 # Setup specific logger for LLM interactions
 llm_logger = setup_logger('llm_interactions', 'llm_interactions.log')
 
 class LLMClient:
-    def __init__(self, playbook: Optional[Dict[str, Any]] = None):
+    def __init__(self, playbook: Optional[Dict[str, Any]] = None, router: Optional[ModelRouter] = None,
+                 response_cache: Optional[ResponseCache] = None):
         """
         Initialize the LLM client with API key from environment.
         
         Args:
             playbook: Optional dictionary containing playbook configuration
+            router: Optional ModelRouter to share model statistics between clients
+            response_cache: Optional ResponseCache to share cached replies between clients
         """
-        load_dotenv()
+        load_env()
         self.api_key = os.getenv('OPENROUTER_API_KEY')
-        self.base_url = "https://openrouter.ai/api/v1/chat/completions"
+        self.router = router or ModelRouter(create_backend(self.api_key))
         self.playbook = playbook
+        self.max_tokens = 150
+        # Replies to utterances already answered at the same point of the
+        # script are reused; playbooks can opt out with "response_cache": False
+        # or in to approximate matching with "response_cache_threshold"
+        cache_config = self.playbook or {}
+        if cache_config.get("response_cache") is False:
+            self.response_cache = None
+        else:
+            self.response_cache = response_cache or ResponseCache(
+                threshold=cache_config.get("response_cache_threshold", DEFAULT_THRESHOLD)
+            )
         # Initialize conversation history with the system message
         self.conversation_history = [
             {"role": "system", "content": self.get_system_prompt()}
@@ -29,8 +46,15 @@ class LLMClient:
         
         # Reference to store performance metrics - will be set from server.py
         self.store_performance_metric = None
+        # Optional AdmissionController limiting concurrent LLM requests - set from server.py
+        self.admission = None
+        # Router result (model, latency_ms, received_tokens, hedged) of the
+        # last reply that came from the LLM, None if it was cached or failed
+        self.last_completion = None
+        # Cache lookup result of the last reply if it came from the response cache
+        self.last_cache_hit = None
         
-        if not self.api_key:
+        if not self.api_key and isinstance(self.router.backend, OpenRouterBackend):
             llm_logger.error("OpenRouter API key not found. Please add it to your .env file.")
         
         if self.playbook:
@@ -55,29 +79,42 @@ class LLMClient:
             If you don't know something, be honest about it.
             """
     
-    def get_response(self, user_input="", call_id=None):
-        """Get a response from the LLM via OpenRouter."""
+    def get_response(self, user_input="", call_id=None, cancel_token=None, priority=PRIORITY_ONGOING):
+        """
+        Get a response from the LLM via OpenRouter.
+        
+        The completion is routed to the fastest healthy model for the playbook's
+        quality tier and streamed so that the request can be abandoned as soon
+        as cancel_token is cancelled (the caller barged in). Returns None if the
+        turn was cancelled before the reply finished.
+        
+        With admission control, the request first waits for an LLM slot in
+        priority order (see admission.py).
+        """
         if not user_input:
             if self.playbook and "default_input" in self.playbook:
                 user_input = self.playbook["default_input"]
             else:
                 user_input = "Hello, who am I speaking with?"
             
-        llm_logger.info(f"User input: {user_input}")
+        llm_logger.info("User input: %s", user_input)
+        self.last_completion = None
+        self.last_cache_hit = None
+        
+        cache_key = (self.playbook.get("name", "") if self.playbook else "", self._conversation_state(), user_input)
+        if self.response_cache is not None:
+            cached = self.response_cache.get(*cache_key)
+            if cached:
+                self.last_cache_hit = cached
+                self.add_scripted_turn(user_input, cached["reply"])
+                self._record_cache_hit(call_id, cached)
+                return cached["reply"]
         
         # Add user message to conversation history
         self.conversation_history.append({"role": "user", "content": user_input})
         
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {self.api_key}"
-        }
-        
-        data = {
-            "model": "openrouter/auto",
-            "messages": self.conversation_history,
-            "max_tokens": 150
-        }
+        quality_tier = self.playbook.get("quality_tier", 1) if self.playbook else 1
+        metadata = {"input_length": len(user_input)}
         
         try:
             # Measure LLM API request time
@@ -85,35 +122,98 @@ class LLMClient:
                 call_id, 
                 "llm_processing", 
                 self.store_performance_metric, 
-                {"input_length": len(user_input)}
+                metadata
             ):
-                response = requests.post(
-                    self.base_url,
-                    headers=headers,
-                    data=json.dumps(data)
-                )
-                response_data = response.json()
-                
-            llm_logger.info(f"OpenRouter response: {response_data}")
+                with self._llm_slot(priority, cancel_token):
+                    completion = self.router.complete(
+                        list(self.conversation_history),
+                        self.max_tokens,
+                        tier=quality_tier,
+                        cancel_token=cancel_token
+                    )
+                metadata["model"] = completion["model"]
+                metadata["hedged"] = completion["hedged"]
+            
+            result = completion["text"]
+            received_tokens = completion["received_tokens"]
             
-            if "choices" in response_data and len(response_data["choices"]) > 0:
-                result = response_data["choices"][0]["message"]["content"].strip()
+            if cancel_token is not None and cancel_token.cancelled:
+                self._record_cancellation(call_id, received_tokens)
+                return None
+            
+            if result:
+                self.last_completion = completion
+                result = result.strip()
                 # Add assistant response to conversation history
                 self.conversation_history.append({"role": "assistant", "content": result})
-                llm_logger.info(f"LLM response: {result}")
+                llm_logger.info("LLM response: %s", result)
+                if self.response_cache is not None:
+                    self.response_cache.put(*cache_key, result, completion["latency_ms"])
                 return result
             else:
-                llm_logger.error(f"Unexpected response format: {response_data}")
+                llm_logger.error(f"Empty completion from {completion['model']}")
                 error_msg = "I'm having trouble processing your request right now."
                 self.conversation_history.append({"role": "assistant", "content": error_msg})
                 return error_msg
         
+        except SlotUnavailable as e:
+            if cancel_token is not None and cancel_token.cancelled:
+                self._record_cancellation(call_id, 0)
+                return None
+            llm_logger.error(f"Error getting LLM response: {str(e)}")
+            error_msg = "I'm sorry, I'm having technical difficulties at the moment."
+            self.conversation_history.append({"role": "assistant", "content": error_msg})
+            return error_msg
+        
         except Exception as e:
             llm_logger.error(f"Error getting LLM response: {str(e)}")
             error_msg = "I'm sorry, I'm having technical difficulties at the moment."
             self.conversation_history.append({"role": "assistant", "content": error_msg})
             return error_msg
     
+    def _llm_slot(self, priority, cancel_token):
+        if self.admission is None:
+            return nullcontext()
+        return self.admission.slot('llm', priority, cancel_token=cancel_token)
+    
+    def _conversation_state(self):
+        """The last assistant message, i.e. the point of the script the caller answers"""
+        for message in reversed(self.conversation_history):
+            if message["role"] == "assistant":
+                return message["content"]
+        return ""
+    
+    def _record_cache_hit(self, call_id, cached):
+        llm_logger.info("LLM reply served from cache (similarity %s)", cached["similarity"])
+        if self.store_performance_metric and callable(self.store_performance_metric):
+            now = datetime.now()
+            self.store_performance_metric(
+                call_id,
+                "llm_cache_hit",
+                now,
+                now,
+                {"similarity": cached["similarity"], "saved_ms": cached["saved_ms"]}
+            )
+    
+    def add_scripted_turn(self, user_input, reply):
+        """Record a turn answered without the LLM, so later replies see it"""
+        self.conversation_history.append({"role": "user", "content": user_input})
+        self.conversation_history.append({"role": "assistant", "content": reply})
+    
+    def _record_cancellation(self, call_id, received_tokens):
+        """Store the unused token budget of a cancelled turn as saved cost"""
+        saved_tokens = max(self.max_tokens - received_tokens, 0)
+        llm_logger.info("LLM turn cancelled, saved up to %d tokens", saved_tokens)
+        if self.store_performance_metric and callable(self.store_performance_metric):
+            now = datetime.now()
+            self.store_performance_metric(
+                call_id,
+                "llm_cancelled",
+                now,
+                now,
+                {"received_tokens": received_tokens, "saved_tokens": saved_tokens}
+            )
+    
     def reset_conversation(self):
         """Reset the conversation history, keeping only the system message."""
         self.conversation_history = [
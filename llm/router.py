@@ -0,0 +1,217 @@
+import os
+import logging
+import time
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from cancellation import CancelToken
+
+# Shares llm_interactions.log with llm/client.py, which sets the logger up
+llm_logger = logging.getLogger('llm_interactions')
+
+# Models to route between, with the quality tier each one satisfies.
+# A playbook asking for quality tier N may use any model with tier >= N.
+DEFAULT_MODELS = [
+    {"name": "openrouter/auto", "tier": 2},
+]
+
+
+def load_models_from_env():
+    """
+    Parse LLM_MODELS ("model:tier,model:tier,...") into model configs,
+    falling back to DEFAULT_MODELS.
+    """
+    spec = os.getenv('LLM_MODELS')
+    if not spec:
+        return list(DEFAULT_MODELS)
+
+    models = []
+    for item in spec.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        name, _, tier = item.rpartition(':')
+        if not name or not tier.isdigit():
+            # No tier given, e.g. "openrouter/auto"
+            name, tier = item, "1"
+        models.append({"name": name, "tier": int(tier)})
+    return models
+
+
+class ModelStats:
+    """Rolling latency and error statistics for one model"""
+
+    def __init__(self, window=50):
+        self.latencies_ms = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)  # True for success, False for error
+        self.last_error_at = None
+        self.lock = threading.Lock()
+
+    def record(self, latency_ms, success):
+        with self.lock:
+            self.outcomes.append(success)
+            if success:
+                self.latencies_ms.append(latency_ms)
+            else:
+                self.last_error_at = time.monotonic()
+
+    def error_rate(self):
+        with self.lock:
+            if not self.outcomes:
+                return 0.0
+            return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, pct):
+        with self.lock:
+            if not self.latencies_ms:
+                return None
+            ordered = sorted(self.latencies_ms)
+        index = min(int(len(ordered) * pct / 100), len(ordered) - 1)
+        return ordered[index]
+
+    def snapshot(self):
+        with self.lock:
+            samples = len(self.latencies_ms)
+        return {
+            "samples": samples,
+            "p50_ms": self.percentile(50),
+            "p95_ms": self.percentile(95),
+            "error_rate": round(self.error_rate(), 3),
+        }
+
+
+class ModelRouter:
+    """
+    Routes each completion to the fastest healthy model that meets the
+    requested quality tier, hedging to a second model when the first one
+    runs past its p95 latency.
+    """
+
+    def __init__(self, backend, models=None, window=50, max_error_rate=0.5,
+                 min_samples=5, default_hedge_ms=3000, retry_after_s=30, max_workers=16):
+        self.backend = backend
+        self.models = models if models is not None else load_models_from_env()
+        self.stats = {model["name"]: ModelStats(window) for model in self.models}
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.default_hedge_ms = default_hedge_ms
+        self.retry_after_s = retry_after_s
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="llm-route")
+
+    def is_healthy(self, model):
+        """
+        A model is healthy while its error rate is acceptable. Unhealthy models
+        get another chance once retry_after_s has passed since their last error.
+        """
+        stats = self.stats[model]
+        if stats.error_rate() <= self.max_error_rate:
+            return True
+        return time.monotonic() - stats.last_error_at >= self.retry_after_s
+
+    def candidates(self, tier=1):
+        """
+        Models eligible for the given tier, best first: healthy before
+        unhealthy, then models without enough samples (so they get measured),
+        then by median latency.
+        """
+        eligible = [m["name"] for m in self.models if m["tier"] >= tier]
+        if not eligible:
+            # Nothing meets the tier; use the best models we have
+            llm_logger.warning(f"No model configured for quality tier {tier}")
+            best_tier = max(m["tier"] for m in self.models)
+            eligible = [m["name"] for m in self.models if m["tier"] == best_tier]
+
+        def sort_key(name):
+            stats = self.stats[name]
+            healthy = self.is_healthy(name)
+            samples = len(stats.latencies_ms)
+            p50 = stats.percentile(50) or 0
+            return (not healthy, samples >= self.min_samples, p50)
+
+        return sorted(eligible, key=sort_key)
+
+    def hedge_deadline_ms(self, model):
+        """p95 latency of the model, or the default before enough samples exist"""
+        stats = self.stats[model]
+        if len(stats.latencies_ms) < self.min_samples:
+            return self.default_hedge_ms
+        return stats.percentile(95)
+
+    def _attempt(self, model, messages, max_tokens, cancel_token):
+        start = time.perf_counter()
+        try:
+            text, received_tokens = self.backend.complete(model, messages, max_tokens, cancel_token)
+        except Exception:
+            self.stats[model].record((time.perf_counter() - start) * 1000, False)
+            raise
+        latency_ms = (time.perf_counter() - start) * 1000
+        if not cancel_token.cancelled:
+            self.stats[model].record(latency_ms, True)
+        elif cancel_token.reason == "hedge_lost" and not (cancel_token.parent and cancel_token.parent.cancelled):
+            # Lost the race: the model would have taken at least this long.
+            # Recording the lower bound lets a model that slowed down fall
+            # behind the one beating it. A turn cancelled by barge-in says
+            # nothing about the model's speed.
+            self.stats[model].record(latency_ms, True)
+        return {"text": text, "received_tokens": received_tokens, "model": model, "latency_ms": latency_ms}
+
+    def complete(self, messages, max_tokens, tier=1, cancel_token=None):
+        """
+        Get a completion, hedging across models.
+
+        Returns:
+            dict: text, received_tokens, model, latency_ms and hedged. Raises
+            the last backend error if every attempted model failed.
+        """
+        candidates = self.candidates(tier)
+        pending = {}
+        tokens = {}
+        last_error = None
+        hedged = False
+
+        def launch(model):
+            token = CancelToken(parent=cancel_token)
+            future = self.executor.submit(self._attempt, model, messages, max_tokens, token)
+            pending[future] = model
+            tokens[future] = token
+            return time.monotonic() + self.hedge_deadline_ms(model) / 1000
+
+        deadline = launch(candidates.pop(0))
+
+        while pending:
+            timeout = None
+            if candidates and not hedged:
+                timeout = max(deadline - time.monotonic(), 0)
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                # First model is past its p95; race a second one against it
+                hedged = True
+                llm_logger.info("Hedging LLM request to %s", candidates[0])
+                launch(candidates.pop(0))
+                continue
+
+            for future in done:
+                model = pending.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    llm_logger.error(f"Model {model} failed: {str(e)}")
+                    last_error = e
+                    continue
+
+                # Winner found; stop the other attempts
+                for other in pending:
+                    tokens[other].cancel("hedge_lost")
+                result["hedged"] = hedged
+                return result
+
+            if not pending and candidates and not (cancel_token is not None and cancel_token.cancelled):
+                # Everything in flight failed; fail over to the next model
+                deadline = launch(candidates.pop(0))
+
+        raise last_error
+
+    def snapshot(self):
+        """Current per-model statistics, for status reporting"""
+        return {name: stats.snapshot() for name, stats in self.stats.items()}
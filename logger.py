@@ -1,45 +1,185 @@
 import os
+import json
+import queue
+import atexit
+import random
 import logging
-from logging.handlers import RotatingFileHandler
+import threading
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
+
+LOG_DIR = 'logs'
+
+# "json" writes one structured record per line, "text" the classic format
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'json')
+
+# Records waiting for the writer thread; when full, new records are dropped
+# rather than blocking the request that logged them
+LOG_QUEUE_SIZE = int(os.getenv('LOG_QUEUE_SIZE', '50000'))
+
+TEXT_FORMATTER = logging.Formatter(
+    '%(asctime)s:%(msecs)03d | %(name)s | %(levelname)s | %(message)s',
+    datefmt='%Y-%m-%d %H:%M:%S'
+)
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as single-line JSON, including any extra= fields"""
+
+    def format(self, record):
+        data = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + f'.{int(record.msecs):03d}',
+            'logger': record.name,
+            'level': record.levelname,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS:
+                data[key] = value
+        if record.exc_text:
+            data['exception'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keeps only a fraction of a logger's records below WARNING, for high-volume
+    messages. Warnings and errors are always kept.
+    """
+
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """
+    Queue handler that defers formatting to the writer thread and drops
+    records instead of blocking when the queue is full.
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        # Only render the traceback here, since it references live frames.
+        # The message itself is formatted lazily by the writer thread, so
+        # log with %-style arguments and don't mutate them afterwards.
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            NonBlockingQueueHandler.dropped += 1
+
+
+class _FileRouter(logging.Handler):
+    """Runs on the writer thread and sends each record to its logger's file"""
+
+    def __init__(self):
+        super().__init__()
+        self.handlers = {}
+
+    def add(self, name, handler):
+        previous = self.handlers.get(name)
+        self.handlers[name] = handler
+        if previous is not None and previous is not handler:
+            previous.close()
+
+    def emit(self, record):
+        handler = self.handlers.get(record.name)
+        if handler is not None:
+            handler.handle(record)
+
+
+def _parse_sample_rates():
+    """Parse LOG_SAMPLE_RATES, e.g. "database=0.1,llm_interactions=0.5" """
+    rates = {}
+    for item in os.getenv('LOG_SAMPLE_RATES', '').split(','):
+        name, _, rate = item.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+
+_pipeline = {'queue': None, 'router': None, 'listener': None, 'lock': threading.Lock()}
+
+
+def _get_pipeline():
+    """Start the shared queue and its single writer thread on first use"""
+    with _pipeline['lock']:
+        if _pipeline['listener'] is None:
+            os.makedirs(LOG_DIR, exist_ok=True)
+
+            console_handler = logging.StreamHandler()
+            console_handler.setFormatter(TEXT_FORMATTER)
+            console_handler.setLevel(logging.ERROR)
+
+            _pipeline['queue'] = queue.Queue(LOG_QUEUE_SIZE)
+            _pipeline['router'] = _FileRouter()
+            _pipeline['listener'] = QueueListener(
+                _pipeline['queue'], _pipeline['router'], console_handler,
+                respect_handler_level=True
+            )
+            _pipeline['listener'].start()
+            atexit.register(shutdown_logging)
+        return _pipeline
+
+
+def shutdown_logging():
+    """Flush queued records and stop the writer thread"""
+    with _pipeline['lock']:
+        if _pipeline['listener'] is not None:
+            _pipeline['listener'].stop()
+            _pipeline['listener'] = None
+
 
 def setup_logger(name, log_file, level=logging.INFO):
-    """Set up a logger with specified name and file."""
-    # Create logs directory if it doesn't exist
-    if not os.path.exists('logs'):
-        os.makedirs('logs')
-    
-    log_path = os.path.join('logs', log_file)
-    
+    """
+    Set up a logger with specified name and file.
+
+    Records are put on a shared queue and written by a single background
+    thread, so logging never blocks the calling request.
+    """
+    pipeline = _get_pipeline()
+
     # Configure logger
     logger = logging.getLogger(name)
-    
+
     # Avoid duplicate handlers
     if logger.hasHandlers():
         logger.handlers.clear()
-    
+
     logger.setLevel(level)
-    
-    # Create file handler
-    file_handler = RotatingFileHandler(
-        log_path, 
-        maxBytes=10485760,  # 10MB
-        backupCount=5
-    )
-    
-    # Create formatter and add it to the handler
-    formatter = logging.Formatter(
-        '%(asctime)s:%(msecs)03d | %(name)s | %(levelname)s | %(message)s',
-        datefmt='%Y-%m-%d %H:%M:%S'
-    )
-    file_handler.setFormatter(formatter)
-    
-    # Create console handler
-    console_handler = logging.StreamHandler()
-    console_handler.setFormatter(formatter)
-    console_handler.setLevel(logging.ERROR)
-    
-    # Add handlers to logger
-    logger.addHandler(file_handler)
-    logger.addHandler(console_handler)
-    
-    return logger
\ No newline at end of file
+    logger.propagate = False
+
+    # Create file handler, written to by the listener thread only. A logger
+    # set up again for the same file keeps its handler, so the file isn't
+    # opened twice.
+    path = os.path.abspath(os.path.join(LOG_DIR, log_file))
+    file_handler = pipeline['router'].handlers.get(name)
+    if file_handler is None or file_handler.baseFilename != path:
+        file_handler = RotatingFileHandler(
+            path,
+            maxBytes=10485760,  # 10MB
+            backupCount=5,
+            encoding='utf-8'
+        )
+        file_handler.setFormatter(JsonFormatter() if LOG_FORMAT == 'json' else TEXT_FORMATTER)
+        pipeline['router'].add(name, file_handler)
+
+    queue_handler = NonBlockingQueueHandler(pipeline['queue'])
+    sample_rate = _parse_sample_rates().get(name)
+    if sample_rate is not None:
+        queue_handler.addFilter(SamplingFilter(sample_rate))
+    logger.addHandler(queue_handler)
+
+    return logger
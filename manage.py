@@ -0,0 +1,108 @@
+"""
+Maintenance commands for the AI Telemarketer database.
+
+Usage:
+    python manage.py reconcile-counters [--fix]
+    python manage.py retention [--dry-run]
+    python manage.py enable-incremental-vacuum
+    python manage.py export TABLE [--format csv.gz|arrow|parquet] [--incremental] [-o FILE]
+    python manage.py rebuild-search-index
+"""
+import argparse
+import sys
+import database as db
+import retention
+import export
+
+
+def reconcile_counters(args):
+    """Check the trigger-maintained row counters against real counts"""
+    report = db.reconcile_counters(fix=args.fix)
+    drifted = False
+    for name, values in report.items():
+        ok = values["counter"] == values["actual"]
+        drifted = drifted or not ok
+        status = "ok" if ok else ("fixed" if args.fix else "DRIFT")
+        print(f"{name:<24}counter={values['counter']!s:<10}actual={values['actual']!s:<10}{status}")
+    # Non-zero exit lets cron jobs alert on unfixed drift
+    return 1 if drifted and not args.fix else 0
+
+
+def run_retention(args):
+    """Archive and prune old call data according to the retention policies"""
+    results = retention.run_retention(dry_run=args.dry_run)
+    verb = "would process" if args.dry_run else "processed"
+    for table, count in results.items():
+        policy = retention.RETENTION_POLICIES[table]
+        print(f"{table}: {verb} {count} rows ({policy['action']} after {policy['days']} days)")
+    return 0
+
+
+def enable_incremental_vacuum(args):
+    """Switch the database file to incremental auto-vacuum"""
+    retention.enable_incremental_vacuum()
+    print("Incremental vacuum enabled")
+    return 0
+
+
+def run_export(args):
+    """Export a table, optionally only the rows added since the last export"""
+    since_id = export.get_watermark(args.table) if args.incremental else args.since_id
+    until_id = export.max_id(args.table)
+    output = args.output or f"{args.table}-{since_id}-{until_id}.{args.format}"
+
+    size = 0
+    with open(output, 'wb') as f:
+        for chunk in export.export_table(args.table, args.format, since_id=since_id, until_id=until_id):
+            f.write(chunk)
+            size += len(chunk)
+
+    # Only advance the watermark once the file is completely written
+    if args.incremental:
+        export.set_watermark(args.table, until_id)
+    if until_id > since_id:
+        print(f"Exported {args.table} ids {since_id + 1}-{until_id} to {output} ({size} bytes)")
+    else:
+        print(f"No new {args.table} rows since id {since_id}, wrote empty export to {output}")
+    return 0
+
+
+def rebuild_search_index(args):
+    """Rebuild and optimize the transcript search index"""
+    db.rebuild_search_index()
+    print("Search index rebuilt")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    reconcile = subparsers.add_parser("reconcile-counters", help="check row counters against real counts")
+    reconcile.add_argument("--fix", action="store_true", help="overwrite drifted counters")
+    reconcile.set_defaults(func=reconcile_counters)
+
+    retention_parser = subparsers.add_parser("retention", help="archive old calls and prune old metrics")
+    retention_parser.add_argument("--dry-run", action="store_true", help="only report what would be processed")
+    retention_parser.set_defaults(func=run_retention)
+
+    vacuum = subparsers.add_parser("enable-incremental-vacuum", help="one-off full VACUUM enabling incremental vacuum")
+    vacuum.set_defaults(func=enable_incremental_vacuum)
+
+    export_parser = subparsers.add_parser("export", help="bulk export a table for offline analysis")
+    export_parser.add_argument("table", choices=sorted(export.EXPORT_TABLES))
+    export_parser.add_argument("--format", choices=sorted(export.EXPORT_FORMATS), default="csv.gz")
+    export_parser.add_argument("--since-id", type=int, default=0, help="only export rows with a larger id")
+    export_parser.add_argument("--incremental", action="store_true", help="continue from the last incremental export")
+    export_parser.add_argument("-o", "--output", help="output file")
+    export_parser.set_defaults(func=run_export)
+
+    search = subparsers.add_parser("rebuild-search-index", help="rebuild and optimize the transcript search index")
+    search.set_defaults(func=rebuild_search_index)
+
+    args = parser.parse_args()
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -32,10 +32,10 @@ class LoggingMiddleware:
     def _log_standard_request(self, log_data):
         """Format and log standard requests"""
         self.logger.info(
-            f"REQ: {log_data['req_type']} | "
-            f"STATUS: {log_data['status_code']} | "
-            f"DURATION: {log_data['duration_ms']}ms | "
-            f"IP: {log_data['ip_addr']}"
+            "REQ: %s | STATUS: %s | DURATION: %sms | IP: %s",
+            log_data['req_type'], log_data['status_code'],
+            log_data['duration_ms'], log_data['ip_addr'],
+            extra=log_data
         )
     
     def _log_twilio_request(self, log_data):
@@ -44,12 +44,10 @@ class LoggingMiddleware:
         from_number = request.values.get('From', 'Unknown')
         
         self.logger.info(
-            f"REQ: {log_data['req_type']} | "
-            f"STATUS: {log_data['status_code']} | "
-            f"DURATION: {log_data['duration_ms']}ms | "
-            f"IP: {log_data['ip_addr']} | "
-            f"CALL_FROM: {from_number} | "
-            f"SID: {call_sid}"
+            "REQ: %s | STATUS: %s | DURATION: %sms | IP: %s | CALL_FROM: %s | SID: %s",
+            log_data['req_type'], log_data['status_code'],
+            log_data['duration_ms'], log_data['ip_addr'], from_number, call_sid,
+            extra=dict(log_data, call_from=from_number, call_sid=call_sid)
         )
 
 def setup_logging_middleware(app, logger):
@@ -41,11 +41,21 @@ def verify_webhook_url(url):
         logger.error(f"Failed to connect to webhook URL: {str(e)}")
         return False
 
-def make_call(to_number):
-    """Make an outbound call using Twilio to the specified number."""
+def make_call(to_number, playbook=None):
+    """
+    Make an outbound call using Twilio to the specified number.
+    
+    Args:
+        to_number: Number to call
+        playbook: Name of the playbook (campaign) to run the call with, see
+            playbooks/__init__.py; defaults to the server's default playbook
+    """
     phone_number = os.getenv('TWILIO_NUM')
     ngrok_url = os.getenv('NGROK_URL').rstrip('/')
     webhook_url = f"{ngrok_url}/answer"
+    if playbook:
+        webhook_url += f"?playbook={playbook}"
+    status_callback_url = f"{ngrok_url}/call_status"
     
     # Quick verification
     if not verify_webhook_url(ngrok_url):
@@ -63,7 +73,11 @@ def make_call(to_number):
             url=webhook_url,
             to=to_number,
             from_=phone_number,
-            method="POST"
+            method="POST",
+            # Lets the server record hang-ups, failed dials and no-answers
+            status_callback=status_callback_url,
+            status_callback_event=["initiated", "ringing", "answered", "completed"],
+            status_callback_method="POST"
         )
         logger.info(f"Call initiated successfully. Call SID: {call.sid}")
         print(f"Call initiated to {to_number} with SID: {call.sid}")
@@ -85,4 +99,4 @@ if __name__ == "__main__":
         print("Error: No recipient phone number provided")
         sys.exit(1)
     
-    make_call(recipient_no)
\ No newline at end of file
+    make_call(recipient_no, os.getenv('PLAYBOOK'))
\ No newline at end of file
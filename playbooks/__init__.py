@@ -1 +1,11 @@
 # This file makes the playbooks directory a Python package
+from playbooks.me_naiset import ME_NAISET_PLAYBOOK
+
+# Playbooks the server can run, by the name given in the "playbook" parameter
+# of the /answer webhook URL (see outbound_call.py)
+PLAYBOOKS = {
+    "me_naiset": ME_NAISET_PLAYBOOK,
+}
+
+# Used for calls that don't name a playbook; can be set with PLAYBOOK
+DEFAULT_PLAYBOOK = "me_naiset"
@@ -73,5 +73,25 @@ ME_NAISET_PLAYBOOK = {
     "name": "Me Naiset Magazine",
     "content": ME_NAISET_PLAYBOOK_CONTENT,
     "system_prompt": ME_NAISET_SYSTEM_PROMPT,
-    "default_input": "Aloita myyntipuhelu Me Naiset -lehdestä."
+    "default_input": "Aloita myyntipuhelu Me Naiset -lehdestä.",
+    # Minimum model quality tier used by the LLM router (see llm/router.py)
+    "quality_tier": 2,
+    # Caller intents recognized without the LLM (see intent.py), in addition
+    # to the objections of the playbook content
+    "intents": {
+        "sale": ["haluan tilata", "otan tarjouksen", "kyllä kiitos", "voin kokeilla", "tilaan lehden"],
+        "hang_up": ["ei kiitos", "en ole kiinnostunut", "älä soita", "lopetetaan tämä", "näkemiin", "hei hei"],
+        "callback": ["soita myöhemmin", "soittakaa myöhemmin", "huono hetki", "huonoon aikaan"]
+    },
+    # Answer recognized objections with their scripted reply, skipping the LLM.
+    # Off until the classifier has been checked against real call transcripts;
+    # intents are still tagged on the transcript
+    "scripted_replies": False,
+    # Speech recognition language and the Twilio <Say> voice used when
+    # ElevenLabs audio isn't available. The ElevenLabs voice and model are the
+    # defaults (Aurora, eleven_flash_v2_5), see tts/voices.py
+    "voice": {
+        "language": "fi-FI",
+        "say_voice": "Polly.Amy"
+    }
 }
@@ -0,0 +1,277 @@
+"""
+Replay recorded conversations against a playbook and LLM backend.
+
+Usage:
+    python replay.py [--jsonl FILE] [--limit 1000] [--status completed]
+                     [--playbook playbooks.me_naiset:ME_NAISET_PLAYBOOK]
+                     [--backend stub|openrouter] [--workers 8] [--free-run]
+                     [--output report.jsonl]
+
+Transcripts come from conversation_entries, or from a JSONL file with one
+conversation per line: {"call_id": ..., "entries": [{"role", "content"}, ...]}.
+Every caller turn is sent to the LLM again. By default the recorded reply
+replaces the new one in the conversation history, so each turn is replayed
+from the same point as the original call; --free-run keeps the new replies.
+Models are taken from LLM_MODELS as in production.
+
+Prints latency, token and similarity statistics and the turns whose replies
+changed the most; --output writes every turn as a JSON line.
+"""
+import argparse
+import difflib
+import importlib
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from config import load_env
+from llm.backends import create_backend
+from llm.cache import ResponseCache, DEFAULT_THRESHOLD, normalize
+from llm.client import LLMClient
+from llm.router import ModelRouter
+import database as db
+
+DEFAULT_PLAYBOOK = "playbooks.me_naiset:ME_NAISET_PLAYBOOK"
+
+
+def load_playbook(spec):
+    """Import a playbook given as "module:NAME" """
+    module_name, _, attribute = spec.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+def load_jsonl(path, limit=None):
+    transcripts = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            transcript = json.loads(line)
+            transcript.setdefault("call_id", len(transcripts) + 1)
+            transcripts.append(transcript)
+            if limit and len(transcripts) >= limit:
+                break
+    return transcripts
+
+
+def split_turns(entries):
+    """
+    Pair caller input with the recorded reply to it.
+
+    A reply without caller input before it is the greeting, replayed with the
+    playbook's default input. Caller input left without a reply is replayed
+    with nothing to compare against.
+
+    Returns:
+        list: (user_input, recorded_reply) tuples
+    """
+    turns = []
+    pending = []
+    for entry in entries:
+        if entry["role"] == "user":
+            pending.append(entry["content"])
+        elif entry["role"] == "assistant":
+            turns.append((" ".join(pending), entry["content"]))
+            pending = []
+    if pending:
+        turns.append((" ".join(pending), None))
+    return turns
+
+
+def similarity(recorded, replayed):
+    """Character similarity of the normalized replies, 0..1"""
+    return difflib.SequenceMatcher(None, normalize(recorded), normalize(replayed)).ratio()
+
+
+def replay_transcript(transcript, playbook, router, response_cache=None, free_run=False):
+    """Replay one conversation turn by turn, returning a result per turn"""
+    client = LLMClient(playbook=playbook, router=router, response_cache=response_cache)
+    results = []
+    for index, (user_input, recorded) in enumerate(split_turns(transcript["entries"])):
+        prompt_chars = sum(len(message["content"]) for message in client.conversation_history) + len(user_input)
+        start = time.perf_counter()
+        reply = client.get_response(user_input)
+        latency_ms = (time.perf_counter() - start) * 1000
+        completion = client.last_completion
+        cached = client.last_cache_hit is not None
+
+        result = {
+            "call_id": transcript["call_id"],
+            "turn": index,
+            "user_input": user_input,
+            "recorded": recorded,
+            "replayed": reply,
+            "latency_ms": round(latency_ms, 1),
+            "model": completion["model"] if completion else None,
+            "hedged": completion["hedged"] if completion else False,
+            "prompt_chars": prompt_chars,
+            "completion_tokens": completion["received_tokens"] if completion else 0,
+            "cached": cached,
+            "error": completion is None and not cached,
+            "exact": None,
+            "similarity": None,
+        }
+        if recorded is not None and reply is not None:
+            result["exact"] = normalize(recorded) == normalize(reply)
+            result["similarity"] = round(similarity(recorded, reply), 3)
+        results.append(result)
+
+        # Continue from the recorded conversation rather than the new reply
+        if recorded is not None and not free_run:
+            history = client.conversation_history
+            if history and history[-1]["role"] == "assistant":
+                history[-1] = {"role": "assistant", "content": recorded}
+            else:
+                history.append({"role": "assistant", "content": recorded})
+    return results
+
+
+def run_replay(transcripts, playbook, router, response_cache=None, workers=8, free_run=False,
+               on_transcript=None):
+    """
+    Replay conversations on a bounded pool of workers. Turns within a
+    conversation run in order; conversations run in parallel.
+
+    Returns:
+        list: Turn results of all conversations, in transcript order
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="replay") as executor:
+        futures = [
+            executor.submit(replay_transcript, transcript, playbook, router, response_cache, free_run)
+            for transcript in transcripts
+        ]
+        for future in futures:
+            turns = future.result()
+            results.extend(turns)
+            if on_transcript:
+                on_transcript(turns)
+    return results
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+
+def summarize(results, elapsed_s):
+    """Aggregate turn results into a report"""
+    latencies = [r["latency_ms"] for r in results if not r["error"]]
+    compared = [r for r in results if r["similarity"] is not None and not r["error"]]
+    models = {}
+    for r in results:
+        if r["model"]:
+            models[r["model"]] = models.get(r["model"], 0) + 1
+    return {
+        "conversations": len({r["call_id"] for r in results}),
+        "turns": len(results),
+        "errors": sum(r["error"] for r in results),
+        "turns_per_s": round(len(results) / elapsed_s, 1) if elapsed_s else None,
+        "latency_p50_ms": percentile(latencies, 50) if latencies else None,
+        "latency_p95_ms": percentile(latencies, 95) if latencies else None,
+        "latency_max_ms": max(latencies) if latencies else None,
+        "completion_tokens": sum(r["completion_tokens"] for r in results),
+        "prompt_chars": sum(r["prompt_chars"] for r in results),
+        "hedged": sum(r["hedged"] for r in results),
+        "cached": sum(r["cached"] for r in results),
+        "models": models,
+        "exact_match_rate": round(sum(r["exact"] for r in compared) / len(compared), 3) if compared else None,
+        "mean_similarity": round(statistics.mean(r["similarity"] for r in compared), 3) if compared else None,
+    }
+
+
+def word_diff(recorded, replayed):
+    """Inline word diff, marking removed words [-like this-] and added ones {+like this+}"""
+    old, new = recorded.split(), replayed.split()
+    parts = []
+    for op, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old, new).get_opcodes():
+        if op == "equal":
+            parts.extend(old[i1:i2])
+            continue
+        if i2 > i1:
+            parts.append(f"[-{' '.join(old[i1:i2])}-]")
+        if j2 > j1:
+            parts.append(f"{{+{' '.join(new[j1:j2])}+}}")
+    return " ".join(parts)
+
+
+def print_report(summary, results, show):
+    for key, value in summary.items():
+        print(f"{key:<20}{value}")
+
+    changed = sorted(
+        (r for r in results if r["similarity"] is not None and not r["exact"]),
+        key=lambda r: r["similarity"]
+    )[:show]
+    if changed:
+        print("\nMost changed replies:")
+    for r in changed:
+        print(f"\ncall {r['call_id']} turn {r['turn']} (similarity {r['similarity']})")
+        print(f"  caller: {r['user_input']}")
+        print(f"  reply:  {word_diff(r['recorded'], r['replayed'])}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jsonl", help="read transcripts from a JSONL file instead of the database")
+    parser.add_argument("--limit", type=int, help="maximum number of conversations")
+    parser.add_argument("--status", help="only calls with this status (database only)")
+    parser.add_argument("--from", dest="date_from", help="only calls started on or after this date (database only)")
+    parser.add_argument("--to", dest="date_to", help="only calls started before this date (database only)")
+    parser.add_argument("--playbook", default=DEFAULT_PLAYBOOK, help="playbook as module:NAME")
+    parser.add_argument("--backend", choices=["openrouter", "stub"], help="defaults to LLM_BACKEND")
+    parser.add_argument("--workers", type=int, default=8, help="conversations replayed in parallel")
+    parser.add_argument("--free-run", action="store_true", help="continue from the new replies, not the recorded ones")
+    parser.add_argument("--cache", action="store_true", help="allow replies from the response cache")
+    parser.add_argument("--show", type=int, default=10, help="number of most changed replies to print")
+    parser.add_argument("-o", "--output", help="write every turn as a JSON line")
+    args = parser.parse_args()
+
+    load_env()
+    if args.jsonl:
+        transcripts = load_jsonl(args.jsonl, args.limit)
+    else:
+        transcripts = db.get_transcripts(args.limit, args.status, args.date_from, args.date_to)
+    if not transcripts:
+        print("No conversations to replay")
+        return 1
+
+    playbook = load_playbook(args.playbook)
+    response_cache = None
+    if args.cache:
+        response_cache = ResponseCache(threshold=playbook.get("response_cache_threshold", DEFAULT_THRESHOLD))
+    else:
+        # Measure the model, not the cache
+        playbook = dict(playbook, response_cache=False)
+    backend = create_backend(os.getenv('OPENROUTER_API_KEY'), args.backend)
+    # One router for all workers, with room for a hedged attempt per turn
+    router = ModelRouter(backend, max_workers=args.workers * 2)
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else None
+    progress = {"done": 0}
+
+    def on_transcript(turns):
+        progress["done"] += 1
+        if output:
+            for turn in turns:
+                output.write(json.dumps(turn, ensure_ascii=False) + "\n")
+        print(f"\rReplayed {progress['done']}/{len(transcripts)} conversations", end="", file=sys.stderr)
+
+    start = time.perf_counter()
+    try:
+        results = run_replay(transcripts, playbook, router, response_cache, args.workers,
+                             args.free_run, on_transcript)
+    finally:
+        if output:
+            output.close()
+    print(file=sys.stderr)
+
+    summary = summarize(results, time.perf_counter() - start)
+    print_report(summary, results, args.show)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
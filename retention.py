@@ -0,0 +1,233 @@
+import os
+import gzip
+import json
+from datetime import datetime, timedelta
+import database as db
+from logger import setup_logger
+
+retention_logger = setup_logger('retention', 'retention.log')
+
+ARCHIVE_DIR = os.getenv('ARCHIVE_DIR', os.path.join(os.path.dirname(__file__), 'archive'))
+
+# Per-table retention policies. Archived calls take their conversation entries
+# and performance metrics with them; metrics of calls still in the hot database
+# are deleted earlier since they are only useful for recent performance stats.
+RETENTION_POLICIES = {
+    "calls": {"action": "archive", "days": 90},
+    "performance_metrics": {"action": "delete", "days": 30},
+}
+
+# Rows handled per transaction, to keep write locks short
+BATCH_SIZE = 200
+# Free pages returned to the filesystem per retention run
+VACUUM_PAGES = 2000
+
+
+def archive_path(start_time):
+    """Monthly archive file for a call, e.g. archive/calls-2025-03.jsonl.gz"""
+    return os.path.join(ARCHIVE_DIR, f"calls-{str(start_time)[:7]}.jsonl.gz")
+
+
+def archive_calls(days, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Move finished calls older than the given number of days, with their
+    conversation entries and metrics, into compressed monthly JSONL archives.
+
+    Returns:
+        int: Number of calls archived
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    if dry_run:
+        conn = db.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT COUNT(*) FROM calls WHERE start_time < ? AND status != 'in-progress'", (cutoff,)
+            )
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    archived = 0
+
+    while True:
+        conn = db.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """
+                SELECT * FROM calls
+                WHERE start_time < ? AND status != 'in-progress'
+                ORDER BY id
+                LIMIT ?
+                """,
+                (cutoff, batch_size)
+            )
+            calls = [dict(row) for row in cursor.fetchall()]
+            if not calls:
+                return archived
+
+            ids = [call['id'] for call in calls]
+            placeholders = ",".join("?" * len(ids))
+            cursor.execute(
+                f"SELECT * FROM conversation_entries WHERE call_id IN ({placeholders}) ORDER BY id", ids
+            )
+            entries = [dict(row) for row in cursor.fetchall()]
+            cursor.execute(
+                f"SELECT * FROM performance_metrics WHERE call_id IN ({placeholders}) ORDER BY id", ids
+            )
+            metrics = [dict(row) for row in cursor.fetchall()]
+
+            for call in calls:
+                call['conversation'] = [e for e in entries if e['call_id'] == call['id']]
+                call['metrics'] = [m for m in metrics if m['call_id'] == call['id']]
+
+            # Write the archive before deleting anything; appending gzip
+            # members to an existing file keeps it a valid gzip stream
+            by_file = {}
+            for call in calls:
+                by_file.setdefault(archive_path(call['start_time']), []).append(call)
+            for path, file_calls in by_file.items():
+                with gzip.open(path, 'at', encoding='utf-8') as f:
+                    for call in file_calls:
+                        f.write(json.dumps(call, default=str) + "\n")
+
+            # Delete the batch and index it in one short transaction
+            cursor.execute(f"DELETE FROM conversation_entries WHERE call_id IN ({placeholders})", ids)
+            cursor.execute(f"DELETE FROM performance_metrics WHERE call_id IN ({placeholders})", ids)
+            cursor.execute(f"DELETE FROM calls WHERE id IN ({placeholders})", ids)
+            cursor.executemany(
+                "INSERT OR REPLACE INTO archived_calls (call_id, call_sid, start_time, archive_file) VALUES (?, ?, ?, ?)",
+                [(c['id'], c['call_sid'], c['start_time'], os.path.basename(archive_path(c['start_time']))) for c in calls]
+            )
+            conn.commit()
+            archived += len(calls)
+            retention_logger.info(f"Archived {len(calls)} calls (ids {ids[0]}-{ids[-1]})")
+        except Exception as e:
+            retention_logger.error(f"Error archiving calls: {str(e)}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+
+def delete_old_rows(table, days, batch_size=BATCH_SIZE, dry_run=False):
+    """
+    Delete rows older than the given number of days from a table with a
+    start_time column, one batch per transaction.
+
+    Returns:
+        int: Number of rows deleted
+    """
+    cutoff = datetime.now() - timedelta(days=days)
+    deleted = 0
+
+    while True:
+        conn = db.get_db_connection()
+        try:
+            cursor = conn.cursor()
+            if dry_run:
+                cursor.execute(f"SELECT COUNT(*) FROM {table} WHERE start_time < ?", (cutoff,))
+                return cursor.fetchone()[0]
+            cursor.execute(
+                f"DELETE FROM {table} WHERE id IN (SELECT id FROM {table} WHERE start_time < ? LIMIT ?)",
+                (cutoff, batch_size)
+            )
+            count = cursor.rowcount
+            conn.commit()
+        except Exception as e:
+            retention_logger.error(f"Error deleting old rows from {table}: {str(e)}")
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
+
+        deleted += count
+        if count < batch_size:
+            if deleted:
+                retention_logger.info(f"Deleted {deleted} rows from {table}")
+            return deleted
+
+
+def incremental_vacuum(pages=VACUUM_PAGES):
+    """
+    Return up to the given number of free pages to the filesystem.
+
+    Only works once the database uses auto_vacuum=INCREMENTAL; see
+    enable_incremental_vacuum().
+
+    Returns:
+        bool: False if incremental vacuum isn't enabled
+    """
+    conn = db.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA auto_vacuum")
+        if cursor.fetchone()[0] != 2:
+            retention_logger.warning("Incremental vacuum not enabled, run: python manage.py enable-incremental-vacuum")
+            return False
+        cursor.execute(f"PRAGMA incremental_vacuum({int(pages)})")
+        cursor.fetchall()
+        return True
+    finally:
+        conn.close()
+
+
+def enable_incremental_vacuum():
+    """Switch the database to auto_vacuum=INCREMENTAL (rewrites the file once)"""
+    conn = db.get_db_connection()
+    try:
+        conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+        conn.execute("VACUUM")
+        retention_logger.info("Enabled incremental vacuum")
+    finally:
+        conn.close()
+
+
+def run_retention(dry_run=False):
+    """
+    Apply all retention policies.
+
+    Returns:
+        dict: table -> number of rows archived or deleted
+    """
+    results = {}
+    for table, policy in RETENTION_POLICIES.items():
+        if policy["action"] == "archive":
+            results[table] = archive_calls(policy["days"], dry_run=dry_run)
+        else:
+            results[table] = delete_old_rows(table, policy["days"], dry_run=dry_run)
+    if not dry_run:
+        incremental_vacuum()
+    return results
+
+
+def get_archived_call(call_id):
+    """
+    Load an archived call with its conversation and metrics, in the same
+    shape as database.get_call_details(). Returns None if it isn't archived.
+    """
+    conn = db.get_db_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT archive_file FROM archived_calls WHERE call_id = ?", (call_id,))
+        row = cursor.fetchone()
+    finally:
+        conn.close()
+
+    if row is None:
+        return None
+
+    path = os.path.join(ARCHIVE_DIR, row['archive_file'])
+    if not os.path.exists(path):
+        retention_logger.error(f"Archive file missing for call {call_id}: {path}")
+        return None
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        for line in f:
+            call = json.loads(line)
+            if call['id'] == call_id:
+                call['archived'] = True
+                return call
+    return None
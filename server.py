@@ -1,33 +1,39 @@
-from flask import Flask, request, render_template, redirect, jsonify, send_file
-from twilio.twiml.voice_response import VoiceResponse, Gather
+from flask import Flask, Blueprint, Response, request, render_template, redirect, jsonify, send_file
 import os
-from dotenv import load_dotenv
+import time
+import uuid
+import tempfile
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeout
+from config import load_env
 from logger import setup_logger
 from middleware.logging_middleware import setup_logging_middleware
-from playbooks.me_naiset import ME_NAISET_PLAYBOOK
-from llm.client import LLMClient
-from tts.elevenlabs_client import ElevenLabsClient
+import playbooks
+from tts.formats import get_format, mimetype_for_path, wav_header
+from tts.voices import voice_config, default_max_concurrency
+from tts.stream_buffer import AudioBuffer
 from admin.routes import admin_bp
+import admin.routes
+from cancellation import CancelToken
+from deadlines import TurnBudgets
+from timing import tracer
+from call_status import CallStatusTracker
+from admission import AdmissionController, SlotUnavailable, PRIORITY_ONGOING, PRIORITY_NEW_CALL, PRIORITY_BACKGROUND
 import database as db
+import twiml
 from datetime import datetime
 
-load_dotenv()
+load_env()
 
 # Setup separate loggers for different concerns
 server_logger = setup_logger('server', 'server.log')
 
-app = Flask(__name__)
+# Call handling routes, registered on the app by create_app()
+calls_bp = Blueprint('calls', __name__)
 NGROK_URL = os.getenv('NGROK_URL')
-
-# Setup logging middleware
-setup_logging_middleware(app, server_logger)
-
-# Register admin blueprint
-app.register_blueprint(admin_bp)
-
-# Initialize clients
-llm_client = LLMClient(playbook=ME_NAISET_PLAYBOOK)
-tts_client = ElevenLabsClient()
+# Playbook of calls whose webhook URL doesn't name one (see playbooks/__init__.py)
+DEFAULT_PLAYBOOK = os.getenv('PLAYBOOK', playbooks.DEFAULT_PLAYBOOK)
 
 # Set up database integration
 def store_performance_metric(call_id, step_name, start_time, end_time, metadata=None):
@@ -38,33 +44,240 @@ def store_performance_metric(call_id, step_name, start_time, end_time, metadata=
         except Exception as e:
             server_logger.error(f"Error storing performance metric: {str(e)}")
 
-# Connect performance tracking
-llm_client.store_performance_metric = store_performance_metric
-tts_client.store_performance_metric = store_performance_metric
+# Limits concurrent LLM/TTS requests and turns new calls away when saturated
+admission = AdmissionController()
+
+# Clients are created on first use (or warmed up in the background by
+# create_app), so importing the server and creating the app stay fast. LLM
+# and intent clients are per playbook; re-entrant since their factories
+# create the shared clients they need.
+_clients = {}
+_clients_lock = threading.RLock()
+
+def _lazy_client(name, factory):
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = _clients[name] = factory()
+    return client
+
+def _create_llm_router():
+    from llm.backends import create_backend
+    from llm.router import ModelRouter
+    return ModelRouter(create_backend(os.getenv('OPENROUTER_API_KEY')))
+
+def _create_llm_client(playbook_name):
+    from llm.client import LLMClient
+    # Model health and latency statistics are shared by all playbooks
+    client = LLMClient(playbook=playbooks.PLAYBOOKS[playbook_name], router=_lazy_client('llm_router', _create_llm_router))
+    client.store_performance_metric = store_performance_metric
+    client.admission = admission
+    return client
+
+def _create_tts_client():
+    from tts.elevenlabs_client import ElevenLabsClient
+    client = ElevenLabsClient()
+    client.store_performance_metric = store_performance_metric
+    return client
+
+def _create_intent_classifier(playbook_name):
+    from intent import IntentClassifier
+    return IntentClassifier(playbooks.PLAYBOOKS[playbook_name])
+
+def get_llm_client(playbook_name=None):
+    playbook_name = playbook_name or DEFAULT_PLAYBOOK
+    return _lazy_client(f'llm:{playbook_name}', lambda: _create_llm_client(playbook_name))
+
+def get_tts_client():
+    return _lazy_client('tts', _create_tts_client)
+
+def get_intent_classifier(playbook_name=None):
+    playbook_name = playbook_name or DEFAULT_PLAYBOOK
+    return _lazy_client(f'intent:{playbook_name}', lambda: _create_intent_classifier(playbook_name))
+
+def get_playbook_name(name):
+    """The playbook a new call asked for, or the default one if it isn't known"""
+    if name in playbooks.PLAYBOOKS:
+        return name
+    if name:
+        server_logger.warning(f"Unknown playbook {name}, using {DEFAULT_PLAYBOOK}")
+    return DEFAULT_PLAYBOOK
+
+def call_playbook(call_sid):
+    """Playbook of an active call"""
+    return calls_data.get(call_sid, {}).get('playbook', DEFAULT_PLAYBOOK)
+
+# Voice settings per playbook (see tts/voices.py)
+_voices = {}
+
+def get_voice(playbook_name=None):
+    """
+    Voice of a playbook. Each voice gets a TTS limit of its own next to the
+    account-wide one, so one busy campaign can't take every TTS slot.
+    """
+    playbook_name = playbook_name or DEFAULT_PLAYBOOK
+    voice = _voices.get(playbook_name)
+    if voice is None:
+        voice = voice_config(playbooks.PLAYBOOKS[playbook_name])
+        max_concurrency = voice["max_concurrency"] or default_max_concurrency(admission.limiters['tts'].max_concurrency)
+        admission.add_resource(voice_resource(voice), max_concurrency)
+        _voices[playbook_name] = voice
+    return voice
+
+def voice_resource(voice):
+    """Admission resource name of a voice"""
+    return f"tts:{voice['key']}"
+
+@contextmanager
+def tts_slot(voice, priority=PRIORITY_ONGOING, cancel_token=None):
+    """Hold a TTS slot of the voice and one of the account for the duration of the block"""
+    with admission.slot(voice_resource(voice), priority, cancel_token=cancel_token):
+        with admission.slot('tts', priority, cancel_token=cancel_token):
+            yield
 
 # Store audio files temporarily
 audio_cache = {}
 # Store active call data
 calls_data = {}
+# In-memory state of calls without a turn for this long is dropped; their
+# end was missed (no /end_call and no status callback)
+CALL_IDLE_TIMEOUT_S = int(os.getenv('CALL_IDLE_TIMEOUT_S', 3600))
+# Twilio ends calls after 4 hours, so calls older than that which never got
+# a final status are marked stale in the database
+MAX_CALL_DURATION_S = 4 * 3600
+# Turns whose LLM reply missed its budget, keyed by turn ID
+pending_turns = {}
+# Audio still being synthesized (TTS_DELIVERY=stream), keyed by audio ID
+audio_buffers = {}
+
+# "file" renders the whole reply before answering, "stream" answers once the
+# first audio arrives and streams the rest to Twilio while it is synthesized
+TTS_DELIVERY = os.getenv('TTS_DELIVERY', 'file')
+
+# Per-turn latency budgets and the worker threads that enforce them
+turn_budgets = TurnBudgets()
+turn_executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="turn")
+
+# Fixed phrases; playbooks in other languages override them in "phrases"
+PHRASES = {
+    # Said when the call ends because the caller stayed silent
+    "goodbye": "Kiitos ajastasi. Näkemiin!",
+    # Played while the caller waits for a reply that missed the LLM budget
+    "filler": "Hetkinen...",
+    # Played to new calls that arrive while the LLM/TTS queues are full
+    "busy": "Pahoittelen, linjamme ovat juuri nyt ruuhkautuneet. Soitamme teille myöhemmin uudelleen. Hyvää päivänjatkoa!",
+    # Said when a reply that missed the LLM budget is given up on
+    "technical_error": "Pahoittelen, minulla on teknisiä ongelmia. Voisitko toistaa?",
+}
+MAX_PENDING_REDIRECTS = 3
+# Pre-rendered fixed phrases and scripted objection replies, keyed by
+# (voice key, text)
+phrase_audio = {'audio_ids': {}, 'rendering': set(), 'lock': threading.Lock()}
 
-@app.route("/")
+def phrase(playbook_name, name):
+    """A fixed phrase in the playbook's language"""
+    return playbooks.PLAYBOOKS[playbook_name].get("phrases", {}).get(name, PHRASES[name])
+
+def release_call(call_sid, reason):
+    """Forget a call's in-memory state and cancel the work still running for it"""
+    call = calls_data.pop(call_sid, None)
+    if call is not None and call.get('cancel_token') is not None:
+        call['cancel_token'].cancel(reason)
+    
+    # Drop replies that are still pending for the call
+    for turn_id, turn in list(pending_turns.items()):
+        if turn['call_sid'] == call_sid:
+            turn['cancel_token'].cancel(reason)
+            pending_turns.pop(turn_id, None)
+    return call
+
+def reap_stale_calls():
+    """Release calls that have been idle too long and expire unfinished ones in the database"""
+    cutoff = time.monotonic() - CALL_IDLE_TIMEOUT_S
+    for call_sid, call in list(calls_data.items()):
+        if call.get('last_seen', cutoff) < cutoff:
+            release_call(call_sid, "stale")
+            server_logger.warning(f"Released stale call {call.get('call_id')}, SID: {call_sid}")
+    db.expire_stale_calls(MAX_CALL_DURATION_S)
+
+# Twilio status callbacks, written to the database in batches
+call_status = CallStatusTracker(reapers=[reap_stale_calls])
+
+def create_app(warm_up=True):
+    """
+    Create the Flask app.
+    
+    The database schema is checked once (see database.ensure_schema) and the
+    LLM, TTS and intent clients are created on first use. With warm_up they
+    are created in the background right away, so the first call doesn't wait.
+    """
+    app = Flask(__name__)
+    
+    # Setup logging middleware
+    setup_logging_middleware(app, server_logger)
+    
+    app.register_blueprint(calls_bp)
+    app.register_blueprint(admin_bp)
+    
+    # Let the admin stats report active calls without querying the database
+    admin.routes.get_active_call_count = lambda: len(calls_data)
+    # and live per-voice TTS statistics
+    admin.routes.get_voice_statistics = lambda: get_tts_client().snapshot()
+    
+    db.ensure_schema()
+    call_status.start()
+    if warm_up:
+        for get_client in (get_llm_client, get_intent_classifier):
+            turn_executor.submit(get_client)
+        turn_executor.submit(warm_up_voices)
+    return app
+
+def warm_up_voices():
+    """Open an ElevenLabs connection for the voice of every playbook and pre-render its fixed phrases"""
+    tts_client = get_tts_client()
+    for playbook_name in playbooks.PLAYBOOKS:
+        tts_client.warm_up(get_voice(playbook_name))
+    render_fixed_phrases()
+
+def render_fixed_phrases():
+    """
+    Pre-render the busy and filler phrases of every playbook in the background.
+    They are needed when TTS is saturated, which is too late to render them.
+    """
+    for playbook_name in playbooks.PLAYBOOKS:
+        render_phrase_audio([phrase(playbook_name, "busy"), phrase(playbook_name, "filler")], get_voice(playbook_name))
+
+@calls_bp.route("/")
 def home():
     """Home page with navigation to admin panel"""
     return render_template('home.html')
 
-@app.route("/status")
+@calls_bp.route("/status")
 def system_status():
     """Show system status and stats for API or redirect to admin system page for browser"""
     try:
         # Get status data
         active_calls = len(calls_data)
         cached_files = len(audio_cache)
+        llm_client = get_llm_client()
+        tts_client = get_tts_client()
         
         status_data = {
             "active_calls": active_calls,
             "cached_audio_files": cached_files,
+            "streaming_audio": len(audio_buffers),
             "llm_client": "Connected" if llm_client.api_key else "Not connected",
+            "llm_models": llm_client.router.snapshot(),
+            "response_cache": llm_client.response_cache.snapshot() if llm_client.response_cache else None,
+            "pending_turns": len(pending_turns),
+            "admission": admission.snapshot(),
+            "call_status": call_status.snapshot(),
+            "turn_budgets": turn_budgets.snapshot(),
+            "timing": tracer.snapshot(),
             "tts_client": "Connected" if tts_client.api_key else "Not connected",
+            "tts_voices": tts_client.snapshot(),
             "database": "Connected"
         }
         
@@ -79,7 +292,7 @@ def system_status():
         server_logger.error(f"Error getting system status: {str(e)}")
         return {"error": str(e)}, 500
 
-@app.route("/cleanup", methods=['GET', 'POST'])
+@calls_bp.route("/cleanup", methods=['GET', 'POST'])
 def cleanup_audio_files():
     """Clean up temporary audio files"""
     count = 0
@@ -92,6 +305,15 @@ def cleanup_audio_files():
         except Exception as e:
             server_logger.error(f"Error cleaning up {audio_id}: {str(e)}")
     
+    # Scripted replies have to be rendered again next time they are needed;
+    # the busy and filler phrases right away, while there is capacity
+    phrase_audio['audio_ids'] = {}
+    for playbook_name in playbooks.PLAYBOOKS:
+        response_cache = get_llm_client(playbook_name).response_cache
+        if response_cache:
+            response_cache.clear_audio()
+    render_fixed_phrases()
+    
     server_logger.info(f"Cleaned up {count} audio files")
     
     # If accessed via GET, redirect to admin dashboard
@@ -100,20 +322,30 @@ def cleanup_audio_files():
     
     return f"Cleaned up {count} audio files", 200
 
-@app.route("/answer", methods=['GET', 'POST'])
+@calls_bp.route("/answer", methods=['GET', 'POST'])
 def answer_call():
     # Get call SID from Twilio
     call_sid = request.values.get('CallSid', 'unknown')
     caller = request.values.get('From', 'unknown')
     
     # Check if this is a new call or continuation
+    priority = PRIORITY_ONGOING
     if call_sid not in calls_data:
+        # The campaign is picked by the "playbook" parameter of the webhook URL
+        playbook_name = get_playbook_name(request.values.get('playbook'))
+        # Under overload, keep serving ongoing calls rather than taking on new ones
+        if not admission.admit_new_call(['llm', 'tts', voice_resource(get_voice(playbook_name))]):
+            server_logger.warning(f"Over capacity, asking SID {call_sid} to be called back later")
+            return busy_response(playbook_name)
+        priority = PRIORITY_NEW_CALL
         try:
             # Create new call record in database
             call_id = db.create_call(call_sid, caller)
             calls_data[call_sid] = {
                 'call_id': call_id,
-                'start_time': datetime.now()
+                'start_time': datetime.now(),
+                'last_seen': time.monotonic(),
+                'playbook': playbook_name
             }
             server_logger.info(f"New call registered with ID: {call_id}, SID: {call_sid}")
         except Exception as e:
@@ -122,69 +354,404 @@ def answer_call():
             call_id = None
     else:
         call_id = calls_data[call_sid]['call_id']
+        calls_data[call_sid]['last_seen'] = time.monotonic()
+        playbook_name = calls_data[call_sid]['playbook']
     
     # Get user input if available (for follow-up calls)
     user_input = request.values.get('SpeechResult', '')
-    server_logger.info(f"Received call with input: '{user_input}'")
+    server_logger.info("Received call with input: '%s'", user_input)
+    
+    # Tag the turn with the caller's intent (sale, objection, hang-up...)
+    intent_classifier = get_intent_classifier(playbook_name)
+    intent = intent_classifier.classify(user_input)
     
     # Store user input in database if not empty
     if user_input and call_id:
         try:
-            db.add_conversation_entry(call_id, 'user', user_input)
+            db.add_conversation_entry(call_id, 'user', user_input, intent=intent and intent['intent'])
         except Exception as e:
             server_logger.error(f"Error storing user input: {str(e)}")
     
-    # Get response from LLM
-    llm_response = llm_client.get_response(user_input)
+    # Start a new turn, cancelling any work still running for the previous one
+    cancel_token = start_turn(call_sid)
+    turn_start = datetime.now()
+    
+    # Answer known objections with the playbook's scripted reply
+    scripted_reply = intent_classifier.scripted_reply(intent)
+    if scripted_reply:
+        get_llm_client(playbook_name).add_scripted_turn(user_input, scripted_reply)
+        store_performance_metric(
+            call_id, "scripted_reply", turn_start, datetime.now(),
+            {"intent": intent['intent'], "score": intent['score']}
+        )
+        return scripted_response(call_sid, call_id, scripted_reply, cancel_token, playbook_name, priority)
+    
+    # Get response from LLM, but don't keep the caller in silence past the budget
+    llm_future = turn_executor.submit(
+        get_llm_client(playbook_name).get_response, user_input, call_id=call_id, cancel_token=cancel_token, priority=priority
+    )
+    try:
+        llm_response = llm_future.result(timeout=turn_budgets.seconds('llm'))
+    except FuturesTimeout:
+        record_budget_miss('llm', call_id, turn_start)
+        turn_id = uuid.uuid4().hex
+        pending_turns[turn_id] = {
+            'future': llm_future,
+            'call_sid': call_sid,
+            'call_id': call_id,
+            'cancel_token': cancel_token,
+            'playbook': playbook_name,
+            'priority': priority,
+            'redirects': 0
+        }
+        server_logger.info("LLM over budget for SID: %s, playing filler for turn %s", call_sid, turn_id)
+        return filler_response(turn_id)
+    
+    return reply_response(call_sid, call_id, llm_response, cancel_token, playbook_name, priority)
+
+@calls_bp.route("/pending/<turn_id>", methods=['GET', 'POST'])
+def pending_turn(turn_id):
+    """Pick up a reply that missed the LLM budget once it is ready"""
+    turn = pending_turns.get(turn_id)
+    if turn is None:
+        server_logger.warning(f"Unknown pending turn: {turn_id}")
+        return twiml.listen(get_voice(call_playbook(request.values.get('CallSid')))["language"], "")
+    
+    try:
+        llm_response = turn['future'].result(timeout=turn_budgets.seconds('llm'))
+    except FuturesTimeout:
+        turn['redirects'] += 1
+        if turn['redirects'] < MAX_PENDING_REDIRECTS:
+            return filler_response(turn_id)
+        # Give up on this turn rather than keep the caller waiting
+        pending_turns.pop(turn_id, None)
+        turn['cancel_token'].cancel("deadline")
+        finish_turn(turn['call_sid'], turn['cancel_token'])
+        server_logger.error(f"Pending turn {turn_id} abandoned after {turn['redirects']} fillers")
+        voice = get_voice(turn['playbook'])
+        return twiml.say_and_listen(
+            phrase(turn['playbook'], "technical_error"), voice["say_voice"], voice["language"], turn['cancel_token'].id
+        )
     
-    # Convert text to speech using ElevenLabs
-    audio_path = tts_client.text_to_speech(llm_response)
+    pending_turns.pop(turn_id, None)
+    return reply_response(
+        turn['call_sid'], turn['call_id'], llm_response, turn['cancel_token'], turn['playbook'], turn['priority']
+    )
+
+def reply_response(call_sid, call_id, llm_response, cancel_token, playbook_name, priority=PRIORITY_ONGOING):
+    """
+    Synthesize the LLM reply in the playbook's voice within the TTS budget and
+    build the TwiML for it. TTS waits for a slot with the turn's priority.
+    """
+    voice = get_voice(playbook_name)
+    if llm_response is None:
+        # The caller spoke over us while the reply was generated; just listen
+        server_logger.info("Turn cancelled by barge-in for SID: %s", call_sid)
+        finish_turn(call_sid, cancel_token)
+        return twiml.listen(voice["language"], cancel_token.id)
     
-    # Create a unique identifier for this audio file
-    audio_id = os.path.basename(audio_path)
-    audio_cache[audio_id] = audio_path
+    # Store assistant response in database
+    if call_id:
+        try:
+            db.add_conversation_entry(call_id, 'assistant', llm_response)
+        except Exception as e:
+            server_logger.error(f"Error storing assistant response: {str(e)}")
     
-    # Create Twilio response
-    response = VoiceResponse()
+    # Replies served from the response cache may have been rendered before;
+    # the cache is per playbook, so the audio is in the playbook's voice
+    response_cache = get_llm_client(playbook_name).response_cache
+    cached_audio_id = response_cache.get_audio(llm_response) if response_cache else None
+    if cached_audio_id in audio_cache:
+        finish_turn(call_sid, cancel_token)
+        server_logger.info("Cached response sent to caller: '%s'", llm_response)
+        return play_response(cached_audio_id, voice, cancel_token)
     
-    # Play the audio file from ElevenLabs
+    if TTS_DELIVERY == 'stream':
+        return streamed_reply_response(call_sid, call_id, llm_response, cancel_token, playbook_name, priority)
+    
+    # Convert text to speech using ElevenLabs, falling back to Twilio's say
+    # if synthesis doesn't finish within the budget
+    tts_start = datetime.now()
+    tts_token = CancelToken(parent=cancel_token)
+    tts_future = turn_executor.submit(
+        synthesize, llm_response, voice, call_id=call_id, cancel_token=tts_token, priority=priority
+    )
+    try:
+        audio_path = tts_future.result(timeout=turn_budgets.seconds('tts'))
+    except FuturesTimeout:
+        record_budget_miss('tts', call_id, tts_start)
+        tts_token.cancel("deadline")
+        audio_path = None
+    finish_turn(call_sid, cancel_token)
+    
+    # Play the audio file from ElevenLabs while listening for the caller, who
+    # can speak over it (barge-in); the call ends if they stay silent
     if audio_path:
-        audio_url = f"{NGROK_URL}/audio/{audio_id}"
-        response.play(audio_url)
+        # Create a unique identifier for this audio file
+        audio_id = os.path.basename(audio_path)
+        audio_cache[audio_id] = audio_path
+        if response_cache:
+            response_cache.set_audio(llm_response, audio_id)
+        response = play_response(audio_id, voice, cancel_token)
     else:
         # Fallback to Twilio's say if ElevenLabs fails
-        response.say(llm_response, voice="Polly.Amy", language="fi-FI")
+        response = twiml.say_and_listen(llm_response, voice["say_voice"], voice["language"], cancel_token.id)
+    
+    server_logger.info("Response sent to caller: '%s'", llm_response)
+    return response
+
+def streamed_reply_response(call_sid, call_id, llm_response, cancel_token, playbook_name, priority=PRIORITY_ONGOING):
+    """
+    Start synthesizing the reply into a shared buffer and answer as soon as the
+    first audio arrives; /audio/<id> streams the rest while it is synthesized.
+    """
+    voice = get_voice(playbook_name)
+    tts_start = datetime.now()
+    audio_id = uuid.uuid4().hex
+    buffer = AudioBuffer(get_tts_client().mimetype)
+    tts_token = CancelToken(parent=cancel_token)
+    audio_buffers[audio_id] = buffer
+    turn_executor.submit(
+        synthesize_to_buffer, audio_id, buffer, llm_response, call_sid, call_id, cancel_token, tts_token,
+        playbook_name, priority
+    )
+    
+    if buffer.wait_for_data(turn_budgets.seconds('tts')):
+        response = play_response(audio_id, voice, cancel_token)
+    else:
+        if not buffer.done:
+            record_budget_miss('tts', call_id, tts_start)
+            tts_token.cancel("deadline")
+        # Fallback to Twilio's say if ElevenLabs fails or is too slow to start
+        audio_buffers.pop(audio_id, None)
+        response = twiml.say_and_listen(llm_response, voice["say_voice"], voice["language"], cancel_token.id)
+    server_logger.info("Response streamed to caller: '%s'", llm_response)
+    return response
+
+def synthesize_to_buffer(audio_id, buffer, text, call_sid, call_id, cancel_token, tts_token, playbook_name,
+                         priority=PRIORITY_ONGOING):
+    """
+    TTS writer for streamed replies. Fills the shared buffer for /audio readers
+    and keeps a copy on disk so later requests are served from the file. The
+    turn stays cancellable by barge-in until synthesis is done.
+    """
+    tts_client = get_tts_client()
+    voice = get_voice(playbook_name)
+    suffix = get_format(tts_client.output_format)["suffix"]
+    temp_path = os.path.join(tempfile.gettempdir(), f"{audio_id}{suffix}")
+    error = None
+    try:
+        with tts_slot(voice, priority, cancel_token=tts_token), open(temp_path, 'wb') as f:
+            data_size = 0
+            for chunk in tts_client.stream_speech(text, call_id=call_id, cancel_token=tts_token, voice=voice):
+                buffer.write(chunk)
+                f.write(chunk)
+                data_size += len(chunk)
+
+            # The buffer was streamed with a placeholder length; give the
+            # copy on disk the real one, as text_to_speech does
+            header_size = len(wav_header(tts_client.output_format))
+            if header_size and data_size >= header_size:
+                f.seek(0)
+                f.write(wav_header(tts_client.output_format, data_size - header_size))
+        if tts_token.cancelled:
+            error = f"cancelled ({tts_token.reason})"
+    except Exception as e:
+        error = str(e)
+        server_logger.error(f"Error synthesizing audio {audio_id}: {error}")
+    finally:
+        buffer.finish(error)
+        if error is None:
+            audio_cache[audio_id] = temp_path
+            response_cache = get_llm_client(playbook_name).response_cache
+            if response_cache:
+                response_cache.set_audio(text, audio_id)
+        elif os.path.exists(temp_path):
+            os.remove(temp_path)
+        audio_buffers.pop(audio_id, None)
+        finish_turn(call_sid, cancel_token)
+
+def synthesize(text, voice, call_id=None, cancel_token=None, priority=PRIORITY_ONGOING):
+    """Text to speech in a voice within a TTS slot; returns None if no slot frees up in time"""
+    try:
+        with tts_slot(voice, priority, cancel_token):
+            return get_tts_client().text_to_speech(text, call_id=call_id, cancel_token=cancel_token, voice=voice)
+    except SlotUnavailable as e:
+        server_logger.warning(f"Skipping TTS: {str(e)}")
+        return None
+
+def busy_response(playbook_name):
+    """Politely end a call we don't have capacity for"""
+    voice = get_voice(playbook_name)
+    text = phrase(playbook_name, "busy")
+    audio_id = phrase_audio_id(text, voice)
+    if audio_id:
+        return twiml.play_and_hangup(f"{NGROK_URL}/audio/{audio_id}")
+    render_phrase_audio([text], voice)
+    return twiml.say_and_hangup(text, voice["say_voice"], voice["language"])
+
+def filler_response(turn_id):
+    """Play a short filler phrase and come back for the pending reply"""
+    playbook_name = pending_turns[turn_id]['playbook']
+    voice = get_voice(playbook_name)
+    text = phrase(playbook_name, "filler")
+    audio_id = phrase_audio_id(text, voice)
+    if audio_id:
+        return twiml.play_and_redirect(f"{NGROK_URL}/audio/{audio_id}", f'/pending/{turn_id}')
+    render_phrase_audio([text], voice)
+    return twiml.say_and_redirect(text, f'/pending/{turn_id}', voice["say_voice"], voice["language"])
+
+def phrase_audio_id(text, voice):
+    """Audio ID of a fixed text pre-rendered in a voice, None if it isn't (or no longer) available"""
+    audio_id = phrase_audio['audio_ids'].get((voice["key"], text))
+    return audio_id if audio_id in audio_cache else None
+
+def render_phrase_audio(texts, voice):
+    """Pre-render fixed texts (phrases, scripted replies) in a voice once in the background"""
+    with phrase_audio['lock']:
+        keys = [
+            (voice["key"], text) for text in texts
+            if (voice["key"], text) not in phrase_audio['rendering'] and phrase_audio_id(text, voice) is None
+        ]
+        if not keys:
+            return
+        phrase_audio['rendering'].update(keys)
+    
+    def render():
+        for key in keys:
+            try:
+                audio_path = synthesize(key[1], voice, priority=PRIORITY_BACKGROUND)
+                if audio_path:
+                    audio_id = os.path.basename(audio_path)
+                    audio_cache[audio_id] = audio_path
+                    phrase_audio['audio_ids'][key] = audio_id
+            finally:
+                with phrase_audio['lock']:
+                    phrase_audio['rendering'].discard(key)
     
-    # Set up for user response
-    gather = Gather(input='speech', 
-                   action='/continue',
-                   language='fi-FI',
-                   speechTimeout='auto')
-    response.append(gather)
+    turn_executor.submit(render)
+
+def scripted_response(call_sid, call_id, reply, cancel_token, playbook_name, priority=PRIORITY_ONGOING):
+    """Answer with a scripted reply, playing its pre-rendered audio when available"""
+    voice = get_voice(playbook_name)
+    audio_id = phrase_audio_id(reply, voice)
+    if audio_id is None:
+        # Not rendered yet (or cleaned up): synthesize this time as usual, and
+        # all of the playbook's scripted replies in the background
+        render_phrase_audio(get_intent_classifier(playbook_name).replies.values(), voice)
+        return reply_response(call_sid, call_id, reply, cancel_token, playbook_name, priority)
     
-    # If user doesn't say anything, wait and then end the call
-    response.redirect('/end_call')
-    server_logger.info(f"Response sent to caller: '{llm_response}'")
-    return str(response)
+    if call_id:
+        try:
+            db.add_conversation_entry(call_id, 'assistant', reply)
+        except Exception as e:
+            server_logger.error(f"Error storing assistant response: {str(e)}")
+    finish_turn(call_sid, cancel_token)
+    server_logger.info("Scripted response sent to caller: '%s'", reply)
+    return play_response(audio_id, voice, cancel_token)
+
+def play_response(audio_id, voice, cancel_token):
+    """TwiML playing already rendered audio of a turn and listening for the caller"""
+    return twiml.play_and_listen(f"{NGROK_URL}/audio/{audio_id}", voice["language"], cancel_token.id)
+
+def record_budget_miss(stage, call_id, start_time):
+    """Count a stage that ran past its latency budget"""
+    turn_budgets.record_miss(stage)
+    server_logger.warning(f"{stage} stage missed its {turn_budgets.budgets_ms[stage]}ms budget")
+    store_performance_metric(
+        call_id,
+        "budget_miss",
+        start_time,
+        datetime.now(),
+        {"stage": stage, "budget_ms": turn_budgets.budgets_ms[stage]}
+    )
+
+def start_turn(call_sid):
+    """Cancel the in-flight turn of a call (if any) and return a token for a new one"""
+    cancel_token = CancelToken()
+    call = calls_data.get(call_sid)
+    if call is not None:
+        previous = call.get('cancel_token')
+        if previous is not None and previous.cancel("superseded"):
+            server_logger.info("Cancelled previous turn for SID: %s", call_sid)
+        call['cancel_token'] = cancel_token
+    return cancel_token
+
+def finish_turn(call_sid, cancel_token):
+    """Stop tracking a turn once its LLM and TTS work is done"""
+    call = calls_data.get(call_sid)
+    if call is not None and call.get('cancel_token') is cancel_token:
+        call['cancel_token'] = None
 
-@app.route("/audio/<audio_id>", methods=['GET'])
+@calls_bp.route("/speech_partial", methods=['POST'])
+def speech_partial():
+    """
+    Twilio partial speech results. The first partial result during a prompt
+    means the caller has started speaking over it, so the LLM/TTS work still
+    in flight for the turn that produced the prompt is cancelled.
+    
+    Partial results arrive on their own requests and the last ones can come
+    after /continue has already started the next turn, so only the turn
+    named in the callback URL is cancelled, and only while its work is still
+    tracked (finish_turn stops tracking it once its audio is produced).
+    """
+    call_sid = request.values.get('CallSid', 'unknown')
+    turn = request.values.get('turn')
+    call = calls_data.get(call_sid)
+    if call is not None and turn:
+        cancel_token = call.get('cancel_token')
+        if cancel_token is not None and cancel_token.id == turn and cancel_token.cancel("barge_in"):
+            server_logger.info("Barge-in detected, cancelled in-flight turn for SID: %s", call_sid)
+    return "", 204
+
+@calls_bp.route("/audio/<audio_id>", methods=['GET'])
 def serve_audio(audio_id):
     """Serve audio files generated by ElevenLabs"""
     if audio_id in audio_cache:
-        server_logger.info(f"Serving audio file: {audio_id}")
-        return send_file(audio_cache[audio_id], mimetype='audio/mpeg')
-    else:
-        server_logger.error(f"Audio file not found: {audio_id}")
-        return "Audio not found", 404
+        server_logger.info("Serving audio file: %s", audio_id)
+        return send_file(audio_cache[audio_id], mimetype=mimetype_for_path(audio_cache[audio_id]))
+    
+    buffer = audio_buffers.get(audio_id)
+    if buffer is not None:
+        # Synthesis still in progress; stream what we have and follow the writer
+        server_logger.info("Streaming audio: %s", audio_id)
+        return Response(buffer.read(), mimetype=buffer.mimetype)
+    
+    server_logger.error(f"Audio file not found: {audio_id}")
+    return "Audio not found", 404
 
-@app.route("/continue", methods=['POST'])
+@calls_bp.route("/continue", methods=['POST'])
 def continue_conversation():
     server_logger.info("Continuing conversation...")
     return answer_call()
 
-@app.route("/end_call", methods=['POST'])
+@calls_bp.route("/call_status", methods=['POST'])
+def call_status_callback():
+    """
+    Twilio status callback (initiated, ringing, answered, completed, busy,
+    no-answer, failed, canceled). Changes are written to the database in
+    batches; a call that is over is released from memory right away.
+    """
+    call_sid = request.values.get('CallSid')
+    status = request.values.get('CallStatus')
+    if not call_sid or not status:
+        return "Missing CallSid or CallStatus", 400
+    
+    duration = request.values.get('CallDuration')
+    finished = call_status.record(
+        call_sid,
+        status,
+        int(duration) if duration and duration.isdigit() else None,
+        request.values.get('From')
+    )
+    if finished and release_call(call_sid, "call_ended") is not None:
+        server_logger.info("Call SID %s ended with status %s", call_sid, status)
+    return "", 204
+
+@calls_bp.route("/end_call", methods=['POST'])
 def end_call():
     call_sid = request.values.get('CallSid', 'unknown')
+    playbook_name = call_playbook(call_sid)
     
     # Get call ID from active calls
     if call_sid in calls_data:
@@ -198,21 +765,19 @@ def end_call():
             
             # Update call status in database
             db.update_call_status(call_id, 'completed', call_duration)
-            
-            # Clean up calls_data
-            del calls_data[call_sid]
             server_logger.info(f"Call {call_id} completed, duration: {call_duration}s")
         except Exception as e:
             server_logger.error(f"Error updating call status: {str(e)}")
     else:
         server_logger.warning(f"Ending call with unknown SID: {call_sid}")
     
+    # Clean up calls_data and drop replies that are still pending for the call
+    release_call(call_sid, "call_ended")
+    
     server_logger.info("Call ending - no user input detected")
-    response = VoiceResponse()
-    response.say("Kiitos ajastasi. Näkemiin!", voice="Polly.Amy", language="fi-FI")
-    response.hangup()
-    return str(response)
+    voice = get_voice(playbook_name)
+    return twiml.say_and_hangup(phrase(playbook_name, "goodbye"), voice["say_voice"], voice["language"])
 
 if __name__ == "__main__":
     server_logger.info("Starting AI Telemarketer server...")
-    app.run(debug=True, port=5001)
\ No newline at end of file
+    create_app().run(debug=True, port=5001)
\ No newline at end of file
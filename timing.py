@@ -1,54 +1,271 @@
+import os
 import time
+import atexit
+import random
 import functools
+import itertools
+import threading
+from collections import deque
 from datetime import datetime
-from contextlib import contextmanager
+from logger import setup_logger
+
+timing_logger = setup_logger('timing', 'timing.log')
+
+# Fraction of spans that are recorded and stored (TIMING_SAMPLE_RATE)
+DEFAULT_SAMPLE_RATE = 1.0
+# Number of span records kept for inspection
+DEFAULT_CAPACITY = 4096
+# How often the background writer stores finished spans
+STORE_INTERVAL_S = 0.05
+
+# Spans are timed with perf_counter_ns and only converted to wall clock
+# time when they are stored, using this anchor taken at import
+_WALL_ANCHOR_NS = time.time_ns()
+_PERF_ANCHOR_NS = time.perf_counter_ns()
+
+
+def to_datetime(perf_ns):
+    """Convert a perf_counter_ns reading to a local datetime"""
+    return datetime.fromtimestamp((_WALL_ANCHOR_NS + perf_ns - _PERF_ANCHOR_NS) / 1e9)
+
+
+class Span:
+    """One timed block. Records are preallocated by the Tracer and reused."""
+
+    __slots__ = ('tracer', 'span_id', 'name', 'call_id', 'parent_id', 'depth',
+                 'start_ns', 'end_ns', 'metadata', 'store_func')
+
+    def __init__(self, tracer=None):
+        self.tracer = tracer
+        self.span_id = 0
+        self.name = None
+        self.call_id = None
+        self.parent_id = None
+        self.depth = 0
+        self.start_ns = 0
+        self.end_ns = 0
+        self.metadata = None
+        self.store_func = None
+
+    @property
+    def open(self):
+        return self.start_ns and not self.end_ns
+
+    @property
+    def duration_ms(self):
+        return (self.end_ns - self.start_ns) / 1e6 if self.end_ns else None
+
+    def __enter__(self):
+        self.tracer.enter(self)
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.tracer.exit(self)
+        return False
+
+    def to_dict(self):
+        return {
+            "span_id": self.span_id,
+            "name": self.name,
+            "call_id": self.call_id,
+            "parent_id": self.parent_id,
+            "depth": self.depth,
+            "start_time": to_datetime(self.start_ns).isoformat(),
+            "duration_ms": self.duration_ms,
+        }
+
+
+class _UnsampledSpan:
+    """Stand-in for spans skipped by sampling"""
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        return False
+
+
+UNSAMPLED = _UnsampledSpan()
+
+
+class Tracer:
+    """
+    Records timed spans into a ring of preallocated records.
+
+    Spans nest per thread: a span started while another is open in the same
+    thread records it as its parent. Finished spans with a store function are
+    handed to a background writer, so storing a metric never adds a database
+    write to the timed request.
+    """
+
+    def __init__(self, capacity=DEFAULT_CAPACITY, sample_rate=None):
+        self.capacity = capacity
+        self.records = [Span(self) for _ in range(capacity)]
+        self.ids = itertools.count(1)
+        self.sample_rate = sample_rate if sample_rate is not None else float(
+            os.getenv('TIMING_SAMPLE_RATE', DEFAULT_SAMPLE_RATE)
+        )
+        self.local = threading.local()
+        self.stats = {"unsampled": 0, "overflow": 0, "store_errors": 0}
+
+        self.pending = deque()  # finished spans waiting for their store function
+        self.storing = False
+        self.wake = threading.Event()
+        self.writer = None
+        self.writer_lock = threading.Lock()
+
+    def span(self, name, call_id=None, store_func=None, metadata=None):
+        """
+        Get a span to use as a context manager.
+
+        Args:
+            name: Name of the step being measured
+            call_id: ID of the current call
+            store_func: Optional function(call_id, step_name, start_time, end_time, metadata)
+            metadata: Optional metadata to store with the timing
+
+        Returns:
+            Span, or a no-op stand-in if the span was not sampled
+        """
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            self.stats["unsampled"] += 1
+            return UNSAMPLED
+
+        span_id = next(self.ids)
+        span = self.records[span_id % self.capacity]
+        if span.open:
+            # Still running since the ring last came around; don't reuse it
+            self.stats["overflow"] += 1
+            span = Span(self)
+        span.span_id = span_id
+        span.name = name
+        span.call_id = call_id
+        span.store_func = store_func
+        span.metadata = metadata
+        span.start_ns = span.end_ns = 0
+        return span
+
+    def enter(self, span):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        if stack:
+            span.parent_id = stack[-1].span_id
+            span.depth = len(stack)
+        else:
+            span.parent_id = None
+            span.depth = 0
+        stack.append(span)
+        span.start_ns = time.perf_counter_ns()
+
+    def exit(self, span):
+        span.end_ns = time.perf_counter_ns()
+        stack = getattr(self.local, 'stack', None) or []
+        if stack and stack[-1] is span:
+            stack.pop()
+        elif span in stack:
+            # Spans held open by generators can finish out of order
+            stack.remove(span)
+        if span.store_func is not None:
+            self._store(span)
+
+    def _store(self, span):
+        # deque.append is atomic, so handing off costs no lock
+        self.pending.append((span.store_func, span.call_id, span.name,
+                             span.start_ns, span.end_ns, span.metadata))
+        if self.writer is None:
+            self._start_writer()
+
+    def _start_writer(self):
+        with self.writer_lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self._write, name="timing-writer", daemon=True)
+                self.writer.start()
+
+    def _write(self):
+        while True:
+            self.wake.wait(STORE_INTERVAL_S)
+            self.wake.clear()
+            while self.pending:
+                self.storing = True
+                store_func, call_id, name, start_ns, end_ns, metadata = self.pending.popleft()
+                try:
+                    store_func(call_id, name, to_datetime(start_ns), to_datetime(end_ns), metadata)
+                except Exception as e:
+                    self.stats["store_errors"] += 1
+                    timing_logger.error("Error storing timing for %s: %s", name, e)
+                finally:
+                    self.storing = False
+
+    def flush(self, timeout=5):
+        """Wait until every finished span has been stored. Returns False on timeout."""
+        deadline = time.monotonic() + timeout
+        while self.pending or self.storing:
+            if self.writer is None or time.monotonic() > deadline:
+                return False
+            self.wake.set()
+            time.sleep(0.001)
+        return True
+
+    def recent(self, limit=100, call_id=None):
+        """Most recently finished spans, newest first"""
+        spans = [span for span in self.records if span.end_ns and (call_id is None or span.call_id == call_id)]
+        spans.sort(key=lambda span: -span.span_id)
+        return [span.to_dict() for span in spans[:limit]]
+
+    def snapshot(self):
+        return {
+            "sample_rate": self.sample_rate,
+            "capacity": self.capacity,
+            "spans": max(span.span_id for span in self.records),
+            "pending_stores": len(self.pending),
+            **self.stats
+        }
+
+
+tracer = Tracer()
+atexit.register(tracer.flush)
+
 
-@contextmanager
 def measure_time(call_id, step_name, store_func, metadata=None):
     """
     Context manager to measure execution time of a block of code
-    
+
     Args:
         call_id: ID of the current call
         step_name: Name of the step being measured
         store_func: Function to store the timing data
         metadata: Optional metadata to store with the timing
     """
-    start_time = datetime.now()
-    try:
-        yield
-    finally:
-        end_time = datetime.now()
-        if store_func and callable(store_func):
-            store_func(call_id, step_name, start_time, end_time, metadata)
+    return tracer.span(step_name, call_id, store_func if callable(store_func) else None, metadata)
+
 
 def time_function(step_name):
     """
     Decorator to measure execution time of a function
-    
+
     Args:
         step_name: Name of the step being measured
     """
     def decorator(func):
+        metadata = {'function': func.__name__}
+
         @functools.wraps(func)
         def wrapper(*args, **kwargs):
             # Extract call_id from kwargs or use None
             call_id = kwargs.get('call_id')
-            
+
             # Access the store_func from the instance if available
             store_func = None
-            if args and hasattr(args[0], 'store_performance_metric'):
-                store_func = args[0].store_performance_metric
-                
-            start_time = datetime.now()
-            try:
-                result = func(*args, **kwargs)
-                return result
-            finally:
-                end_time = datetime.now()
-                if store_func and callable(store_func) and call_id:
-                    metadata = {'function': func.__name__}
-                    store_func(call_id, step_name, start_time, end_time, metadata)
-                    
+            if call_id and args:
+                store_func = getattr(args[0], 'store_performance_metric', None)
+                if not callable(store_func):
+                    store_func = None
+
+            with tracer.span(step_name, call_id, store_func, metadata):
+                return func(*args, **kwargs)
+
         return wrapper
     return decorator
@@ -1,90 +1,334 @@
 import os
-import requests
+import time
 import tempfile
-from dotenv import load_dotenv
+import threading
+from collections import deque
+from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+from config import load_env
 from logger import setup_logger
 from timing import measure_time
+from tts.formats import DEFAULT_OUTPUT_FORMAT, get_format, wav_header
+from tts.voices import voice_config
 
 # Setup logger for TTS operations
 tts_logger = setup_logger('tts', 'tts.log')
 
+# (connect, read) timeouts for ElevenLabs requests
+REQUEST_TIMEOUT = (3.05, 10)
+
+class TTSError(Exception):
+    """Raised when ElevenLabs fails to synthesize speech"""
+
+class VoiceChannel:
+    """
+    Connections and statistics of one voice. Each voice has its own HTTP
+    session, so its connections stay warm between requests and a busy voice
+    can't use up the connection pool of another.
+    """
+
+    def __init__(self, voice, pool_size=10, window=200):
+        self.voice = voice
+        self.session = requests.Session()
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=pool_size))
+        self.latencies_ms = deque(maxlen=window)
+        self.first_byte_ms = deque(maxlen=window)
+        self.finished_at = deque(maxlen=window)  # monotonic times, for throughput
+        self.stats = {"requests": 0, "errors": 0, "cancelled": 0, "characters": 0, "audio_bytes": 0}
+        self.lock = threading.Lock()
+
+    def record(self, characters, audio_bytes=0, latency_ms=None, first_byte_ms=None, outcome="ok"):
+        """Record a finished request; outcome is "ok", "error" or "cancelled" """
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["characters"] += characters
+            self.stats["audio_bytes"] += audio_bytes
+            if outcome == "error":
+                self.stats["errors"] += 1
+            elif outcome == "cancelled":
+                self.stats["cancelled"] += 1
+            elif latency_ms is not None:
+                self.latencies_ms.append(latency_ms)
+                if first_byte_ms is not None:
+                    self.first_byte_ms.append(first_byte_ms)
+            self.finished_at.append(time.monotonic())
+
+    @staticmethod
+    def _percentile(values, pct):
+        if not values:
+            return None
+        ordered = sorted(values)
+        return ordered[min(int(len(ordered) * pct / 100), len(ordered) - 1)]
+
+    def snapshot(self, throughput_window_s=60):
+        with self.lock:
+            latencies = list(self.latencies_ms)
+            first_bytes = list(self.first_byte_ms)
+            cutoff = time.monotonic() - throughput_window_s
+            recent = sum(1 for finished in self.finished_at if finished >= cutoff)
+            stats = dict(self.stats)
+        return {
+            "voice_id": self.voice["voice_id"],
+            "model_id": self.voice["model_id"],
+            "p50_ms": self._percentile(latencies, 50),
+            "p95_ms": self._percentile(latencies, 95),
+            "first_byte_p50_ms": self._percentile(first_bytes, 50),
+            "first_byte_p95_ms": self._percentile(first_bytes, 95),
+            "requests_per_min": round(recent * 60 / throughput_window_s, 1),
+            **stats
+        }
+
 class ElevenLabsClient:
-    def __init__(self):
-        """Initialize ElevenLabs client with API key from environment."""
-        load_dotenv()
+    def __init__(self, output_format=None, chunk_size=None, pool_size=None):
+        """
+        Initialize ElevenLabs client with API key from environment.
+        
+        The voice, model and voice settings come with each request (see
+        tts/voices.py). Every voice gets its own connection pool and
+        statistics, so voices don't compete for connections.
+        
+        Args:
+            output_format: Audio format to request (see tts/formats.py), defaults
+                to TTS_OUTPUT_FORMAT or mp3_44100_128
+            chunk_size: Bytes read from the ElevenLabs stream at a time, defaults
+                to TTS_CHUNK_SIZE or 8192
+            pool_size: Connections kept open per voice, defaults to the voice's
+                max_concurrency or TTS_MAX_CONCURRENCY
+        """
+        load_env()
         self.api_key = os.getenv('ELEVENLABS_API_KEY')
         self.base_url = "https://api.elevenlabs.io/v1"
+        self.output_format = output_format or os.getenv('TTS_OUTPUT_FORMAT', DEFAULT_OUTPUT_FORMAT)
+        get_format(self.output_format)
+        self.chunk_size = chunk_size or int(os.getenv('TTS_CHUNK_SIZE', 8192))
+        self.pool_size = pool_size or int(os.getenv('TTS_MAX_CONCURRENCY', 16))
+        self.default_voice = voice_config()
+        self.channels = {}  # voice key -> VoiceChannel
+        self.channels_lock = threading.Lock()
         
         # Reference to store performance metrics - will be set from server.py
         self.store_performance_metric = None
         
         if not self.api_key:
             tts_logger.error("ElevenLabs API key not found. Please add it to your .env file.")
+    
+    @property
+    def mimetype(self):
+        """MIME type of the audio produced in the configured output format"""
+        return get_format(self.output_format)["mimetype"]
+    
+    def channel(self, voice=None):
+        """VoiceChannel of a voice (see tts/voices.py), created on first use"""
+        voice = voice or self.default_voice
+        channel = self.channels.get(voice["key"])
+        if channel is None:
+            with self.channels_lock:
+                channel = self.channels.get(voice["key"])
+                if channel is None:
+                    pool_size = voice.get("max_concurrency") or self.pool_size
+                    channel = self.channels[voice["key"]] = VoiceChannel(voice, pool_size)
+        return channel
+    
+    def warm_up(self, voice=None):
+        """
+        Open a connection for a voice ahead of its first request, so the first
+        sentence of a call doesn't wait for the TLS handshake.
         
-        self.voice_id = "YSabzCJMvEHDduIDMdwV"  # Voice ID for Aurora
+        Returns:
+            bool: True if ElevenLabs answered
+        """
+        voice = voice or self.default_voice
+        try:
+            response = self.channel(voice).session.get(
+                f"{self.base_url}/voices/{voice['voice_id']}",
+                headers={"xi-api-key": self.api_key},
+                timeout=REQUEST_TIMEOUT
+            )
+            response.close()
+            return response.ok
+        except Exception as e:
+            tts_logger.error(f"Error warming up voice {voice['key']}: {str(e)}")
+            return False
     
-    def text_to_speech(self, text, call_id=None):
+    def snapshot(self):
+        """Live latency and throughput statistics per voice"""
+        return {key: channel.snapshot() for key, channel in list(self.channels.items())}
+    
+    def stream_speech(self, text, call_id=None, cancel_token=None, voice=None):
         """
-        Convert text to speech using ElevenLabs API and save to a temporary file
+        Stream synthesized speech from ElevenLabs as it arrives.
+        
+        Raw telephony formats are preceded by a streaming WAV header so the
+        bytes can be played directly. The generator stops early if cancel_token
+        is cancelled.
         
         Args:
             text: Text to convert to speech
             call_id: ID of the current call for performance tracking
+            cancel_token: Optional CancelToken; synthesis stops when it is cancelled
+            voice: Voice settings from tts.voices.voice_config, defaults to the
+                default voice
             
-        Returns:
-            str: URL of the temporary audio file 
+        Yields:
+            bytes: Audio data
+            
+        Raises:
+            TTSError: If ElevenLabs rejects the request
         """
-        tts_logger.info(f"Converting text to speech: {text[:50]}...")
+        voice = voice or self.default_voice
+        channel = self.channel(voice)
+        if cancel_token is not None and cancel_token.cancelled:
+            self._record_cancellation(call_id, text, sent=False, reason=cancel_token.reason)
+            channel.record(0, outcome="cancelled")
+            return
+        
+        tts_logger.info("Converting text to speech with %s: %.50s...", voice["key"], text)
         
         headers = {
-            "Accept": "audio/mpeg",
+            "Accept": self.mimetype,
             "Content-Type": "application/json",
             "xi-api-key": self.api_key
         }
         
         data = {
             "text": text,
-            "model_id": "eleven_flash_v2_5",
+            "model_id": voice["model_id"],
             "voice_settings": {
-                "stability": 0.5,
-                "similarity_boost": 0.5
+                "stability": voice["stability"],
+                "similarity_boost": voice["similarity_boost"]
             }
         }
         
+        metadata = {"text_length": len(text), "output_format": self.output_format, "voice": voice["key"]}
+        outcome = "error"
+        
+        # Measure TTS API request time
+        with measure_time(
+            call_id, 
+            "tts_processing", 
+            self.store_performance_metric, 
+            metadata
+        ):
+            start = time.perf_counter()
+            try:
+                # Make API request to convert text to speech
+                response = channel.session.post(
+                    f"{self.base_url}/text-to-speech/{voice['voice_id']}/stream",
+                    params={"output_format": self.output_format},
+                    headers=headers,
+                    json=data,
+                    stream=True,
+                    timeout=REQUEST_TIMEOUT
+                )
+                
+                if response.status_code != 200:
+                    message = f"ElevenLabs API error: {response.status_code} - {response.text}"
+                    response.close()
+                    raise TTSError(message)
+                
+                total_bytes = 0
+                try:
+                    header = wav_header(self.output_format)
+                    if header:
+                        yield header
+                    for chunk in response.iter_content(chunk_size=self.chunk_size):
+                        if cancel_token is not None and cancel_token.cancelled:
+                            break
+                        if chunk:
+                            if not total_bytes:
+                                metadata["first_byte_ms"] = int((time.perf_counter() - start) * 1000)
+                            total_bytes += len(chunk)
+                            yield chunk
+                finally:
+                    # Drops the connection if the stream was abandoned early
+                    response.close()
+                    metadata["audio_bytes"] = total_bytes
+                cancelled = cancel_token is not None and cancel_token.cancelled
+                outcome = "cancelled" if cancelled else "ok"
+            except GeneratorExit:
+                # The reader stopped early
+                outcome = "cancelled"
+                raise
+            finally:
+                channel.record(
+                    len(text),
+                    metadata.get("audio_bytes", 0),
+                    latency_ms=int((time.perf_counter() - start) * 1000),
+                    first_byte_ms=metadata.get("first_byte_ms"),
+                    outcome=outcome
+                )
+        
+        if cancel_token is not None and cancel_token.cancelled:
+            self._record_cancellation(call_id, text, sent=True, reason=cancel_token.reason)
+    
+    def text_to_speech(self, text, call_id=None, cancel_token=None, voice=None):
+        """
+        Convert text to speech using ElevenLabs API and save to a temporary file
+        
+        Args:
+            text: Text to convert to speech
+            call_id: ID of the current call for performance tracking
+            cancel_token: Optional CancelToken; synthesis stops when it is cancelled
+            voice: Voice settings from tts.voices.voice_config
+            
+        Returns:
+            str: URL of the temporary audio file, or None on failure or cancellation
+        """
+        temp_path = None
         try:
             # Create temp file to store the audio
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
+            temp_file = tempfile.NamedTemporaryFile(
+                delete=False, suffix=get_format(self.output_format)["suffix"]
+            )
             temp_path = temp_file.name
             temp_file.close()
             
-            # Measure TTS API request time
-            with measure_time(
-                call_id, 
-                "tts_processing", 
-                self.store_performance_metric, 
-                {"text_length": len(text)}
-            ):
-                # Make API request to convert text to speech
-                response = requests.post(
-                    f"{self.base_url}/text-to-speech/{self.voice_id}",
-                    headers=headers,
-                    json=data,
-                    stream=True
-                )
+            # Save audio stream to temp file
+            data_size = 0
+            with open(temp_path, 'wb') as f:
+                for chunk in self.stream_speech(text, call_id=call_id, cancel_token=cancel_token, voice=voice):
+                    f.write(chunk)
+                    data_size += len(chunk)
                 
-                if response.status_code == 200:
-                    # Save audio stream to temp file
-                    with open(temp_path, 'wb') as f:
-                        for chunk in response.iter_content(chunk_size=1024):
-                            if chunk:
-                                f.write(chunk)
-                    
-                    tts_logger.info(f"TTS conversion successful, saved to {temp_path}")
-                    return temp_path
-                else:
-                    tts_logger.error(f"ElevenLabs API error: {response.status_code} - {response.text}")
-                    return None
+                # Now that the length is known, fix up the streaming WAV header
+                header_size = len(wav_header(self.output_format))
+                if header_size and data_size >= header_size:
+                    f.seek(0)
+                    f.write(wav_header(self.output_format, data_size - header_size))
+            
+            if cancel_token is not None and cancel_token.cancelled:
+                # Drop the partial file
+                os.remove(temp_path)
+                return None
+            
+            tts_logger.info("TTS conversion successful, saved to %s", temp_path)
+            return temp_path
                 
         except Exception as e:
             tts_logger.error(f"Error in text_to_speech: {str(e)}")
+            if temp_path and os.path.exists(temp_path):
+                os.remove(temp_path)
             return None
+    
+    def _record_cancellation(self, call_id, text, sent, reason=None):
+        """
+        Record a cancelled synthesis. Characters are only counted as saved when
+        the request was never sent, since ElevenLabs bills on submitted text.
+        """
+        saved_characters = 0 if sent else len(text)
+        tts_logger.info(f"TTS cancelled ({'mid-stream' if sent else 'before request'}), saved {saved_characters} characters")
+        if self.store_performance_metric and callable(self.store_performance_metric):
+            now = datetime.now()
+            self.store_performance_metric(
+                call_id,
+                "tts_cancelled",
+                now,
+                now,
+                {
+                    "text_length": len(text),
+                    "saved_characters": saved_characters,
+                    "stage": "streaming" if sent else "before_request",
+                    "reason": reason
+                }
+            )
@@ -0,0 +1,55 @@
+import struct
+
+# Output formats that can be requested from ElevenLabs and played by Twilio.
+# Raw telephony formats (PCM and μ-law) have no container, so they are wrapped
+# in a WAV header before being handed to Twilio.
+OUTPUT_FORMATS = {
+    "mp3_44100_128": {"mimetype": "audio/mpeg", "suffix": ".mp3"},
+    "mp3_22050_32": {"mimetype": "audio/mpeg", "suffix": ".mp3"},
+    "ulaw_8000": {"mimetype": "audio/wav", "suffix": ".wav",
+                  "wav": {"format_tag": 7, "sample_rate": 8000, "bits": 8}},
+    "pcm_8000": {"mimetype": "audio/wav", "suffix": ".wav",
+                 "wav": {"format_tag": 1, "sample_rate": 8000, "bits": 16}},
+    "pcm_16000": {"mimetype": "audio/wav", "suffix": ".wav",
+                  "wav": {"format_tag": 1, "sample_rate": 16000, "bits": 16}},
+}
+
+DEFAULT_OUTPUT_FORMAT = "mp3_44100_128"
+
+# Placeholder size used in streamed WAV headers, where the length isn't known
+STREAMING_DATA_SIZE = 0xFFFFFFFF - 36
+
+
+def get_format(name):
+    """Look up an output format, raising ValueError for unknown names"""
+    if name not in OUTPUT_FORMATS:
+        raise ValueError(f"Unknown TTS output format: {name}")
+    return OUTPUT_FORMATS[name]
+
+
+def mimetype_for_path(path):
+    """MIME type to serve a stored audio file with, based on its suffix"""
+    if path.endswith(".wav"):
+        return "audio/wav"
+    return "audio/mpeg"
+
+
+def wav_header(format_name, data_size=STREAMING_DATA_SIZE):
+    """
+    Build a 44-byte mono WAV header for a raw output format. Returns b"" for
+    formats that already have a container (MP3).
+    """
+    wav = OUTPUT_FORMATS[format_name].get("wav")
+    if not wav:
+        return b""
+
+    channels = 1
+    block_align = channels * wav["bits"] // 8
+    byte_rate = wav["sample_rate"] * block_align
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", data_size + 36, b"WAVE",
+        b"fmt ", 16, wav["format_tag"], channels, wav["sample_rate"],
+        byte_rate, block_align, wav["bits"],
+        b"data", data_size
+    )
@@ -0,0 +1,66 @@
+import threading
+
+
+class AudioBuffer:
+    """
+    In-memory audio shared between one synthesis writer and any number of
+    HTTP readers.
+
+    The TTS writer appends chunks as they arrive from ElevenLabs; each reader
+    replays the buffer from the start and then follows the writer until the
+    synthesis finishes or fails.
+    """
+
+    def __init__(self, mimetype):
+        self.mimetype = mimetype
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.condition = threading.Condition()
+
+    def write(self, chunk):
+        with self.condition:
+            self.chunks.append(chunk)
+            self.condition.notify_all()
+
+    def finish(self, error=None):
+        """Mark synthesis complete, or failed if an error is given"""
+        with self.condition:
+            self.done = True
+            self.error = error
+            self.condition.notify_all()
+
+    @property
+    def failed(self):
+        return self.error is not None
+
+    def wait_for_data(self, timeout):
+        """
+        Wait until the first chunk arrives or synthesis ends.
+
+        Returns:
+            bool: True if there is audio to play
+        """
+        with self.condition:
+            self.condition.wait_for(lambda: self.chunks or self.done, timeout)
+            return bool(self.chunks)
+
+    def read(self, idle_timeout=10):
+        """
+        Yield the buffered audio, then new chunks as they are written.
+
+        Stops when synthesis finishes. If it fails or stalls for longer than
+        idle_timeout seconds the stream just ends, so the caller hears the
+        audio that was received so far.
+        """
+        index = 0
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: index < len(self.chunks) or self.done, idle_timeout)
+                if index >= len(self.chunks):
+                    # Finished, failed or stalled
+                    return
+                pending = self.chunks[index:]
+                index = len(self.chunks)
+            for chunk in pending:
+                yield chunk
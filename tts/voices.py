@@ -0,0 +1,54 @@
+import os
+import math
+
+# Voice settings playbooks don't set in their "voice" section. The ElevenLabs
+# voice and model can be overridden with ELEVENLABS_VOICE_ID and
+# ELEVENLABS_MODEL_ID for playbooks that don't pick their own.
+DEFAULT_VOICE = {
+    "name": "Aurora",
+    "voice_id": "YSabzCJMvEHDduIDMdwV",
+    "model_id": "eleven_flash_v2_5",
+    # Speech recognition language and Twilio <Say> voice used when
+    # ElevenLabs audio isn't available
+    "language": "fi-FI",
+    "say_voice": "Polly.Amy",
+    "stability": 0.5,
+    "similarity_boost": 0.5,
+    # Concurrent requests for this voice; None for the default share of the
+    # account-wide TTS limit (see default_max_concurrency)
+    "max_concurrency": None,
+}
+
+# Share of the account-wide TTS concurrency one voice may use by default, so
+# a busy campaign always leaves slots for the others
+DEFAULT_VOICE_SHARE = 0.75
+
+
+def default_max_concurrency(total):
+    """Per-voice concurrency limit for an account-wide limit of total"""
+    value = os.getenv('TTS_VOICE_MAX_CONCURRENCY')
+    if value:
+        return int(value)
+    return max(1, math.ceil(total * DEFAULT_VOICE_SHARE))
+
+
+def voice_config(playbook=None):
+    """
+    Voice settings of a playbook: its "voice" section over the defaults.
+
+    Returns:
+        dict: DEFAULT_VOICE keys plus "key", which identifies the voice and
+        model for connection pools, limits, caches and statistics
+    """
+    voice = dict(DEFAULT_VOICE)
+    voice_id = os.getenv('ELEVENLABS_VOICE_ID')
+    if voice_id and voice_id != voice["voice_id"]:
+        # Another voice than the named default
+        voice["voice_id"] = voice["name"] = voice_id
+    voice["model_id"] = os.getenv('ELEVENLABS_MODEL_ID', voice["model_id"])
+    if playbook and playbook.get("voice"):
+        voice.update(playbook["voice"])
+        if "name" not in playbook["voice"] and "voice_id" in playbook["voice"]:
+            voice["name"] = playbook["voice"]["voice_id"]
+    voice["key"] = f"{voice['name']}/{voice['model_id']}"
+    return voice
@@ -0,0 +1,142 @@
+import re
+import functools
+from xml.sax.saxutils import escape
+from twilio.twiml.voice_response import VoiceResponse, Gather
+
+FIELD = re.compile(r"__TWIML_(\w+)__")
+# Extra escaping ElementTree applies to attribute values
+ATTRIBUTE_ENTITIES = {'"': "&quot;", "\r": "&#13;", "\n": "&#10;", "\t": "&#09;"}
+
+
+class TwimlTemplate:
+    """
+    TwiML rendered once by the Twilio library, with placeholders for the
+    parts that change per request (audio URL, text to say, redirect target).
+
+    Rendering only escapes the values and joins them with the pre-rendered
+    XML around them, which gives the same document as building the
+    VoiceResponse would, without building and serializing an element tree on
+    every request.
+    """
+
+    def __init__(self, build, *fields):
+        """
+        Args:
+            build: Function returning a VoiceResponse, called once with a
+                placeholder string for each field as keyword arguments
+            fields: Names of the fields
+        """
+        self.build = build
+        xml = str(build(**{name: f"__TWIML_{name}__" for name in fields}))
+        parts = FIELD.split(xml)
+        # Static text and field names alternate
+        self.static = parts[0::2]
+        self.fields = parts[1::2]
+        # Whether each field is inside a tag (an attribute value) rather than element text
+        preceding = ""
+        self.in_attribute = []
+        for static in self.static[:-1]:
+            preceding += static
+            self.in_attribute.append(preceding.rfind("<") > preceding.rfind(">"))
+
+    def render(self, **values):
+        if not all(values.values()):
+            # An empty element serializes as a self-closing tag
+            return str(self.build(**values))
+        chunks = [self.static[0]]
+        for name, in_attribute, static in zip(self.fields, self.in_attribute, self.static[1:]):
+            # Same escaping as ElementTree uses for element text and attributes
+            chunks.append(escape(str(values[name]), ATTRIBUTE_ENTITIES if in_attribute else {}))
+            chunks.append(static)
+        return "".join(chunks)
+
+
+def build_gather(language, turn):
+    """
+    Create the speech Gather used after every assistant turn. Partial results
+    name the turn whose prompt the caller speaks over, so a late one can't
+    cancel the turn that answers them (see server.speech_partial).
+    """
+    return Gather(input='speech',
+                  action='/continue',
+                  language=language,
+                  speechTimeout='auto',
+                  bargeIn=True,
+                  partialResultCallback=f'/speech_partial?turn={turn}')
+
+
+def _listen(prompt, language, turn):
+    """Response: Gather (around the prompt, so speech interrupts it), then end the call if silent"""
+    response = VoiceResponse()
+    gather = build_gather(language, turn)
+    if prompt:
+        prompt(gather)
+    response.append(gather)
+    response.redirect('/end_call')
+    return response
+
+
+def _respond(prompt, target=None):
+    """Response: the prompt, then redirect to target or hang up"""
+    response = VoiceResponse()
+    prompt(response)
+    if target is None:
+        response.hangup()
+    else:
+        response.redirect(target)
+    return response
+
+
+@functools.lru_cache(maxsize=None)
+def _template(kind, voice, language):
+    """Template of the given kind, built on first use for each voice and language"""
+    def say(verb, text):
+        verb.say(text, voice=voice, language=language)
+
+    builders = {
+        "listen": (lambda turn: _listen(None, language, turn), ("turn",)),
+        "play_and_listen": (lambda url, turn: _listen(lambda g: g.play(url), language, turn), ("url", "turn")),
+        "say_and_listen": (lambda text, turn: _listen(lambda g: say(g, text), language, turn), ("text", "turn")),
+        "play_and_hangup": (lambda url: _respond(lambda r: r.play(url)), ("url",)),
+        "say_and_hangup": (lambda text: _respond(lambda r: say(r, text)), ("text",)),
+        "play_and_redirect": (lambda url, target: _respond(lambda r: r.play(url), target), ("url", "target")),
+        "say_and_redirect": (lambda text, target: _respond(lambda r: say(r, text), target), ("text", "target")),
+    }
+    build, fields = builders[kind]
+    return TwimlTemplate(build, *fields)
+
+
+# The voice and language of a call come from its playbook (see tts/voices.py):
+# the language is used for speech recognition and Twilio's <Say>, the voice
+# for <Say> when ElevenLabs audio isn't available. turn is the ID of the turn
+# that produced the prompt.
+
+def listen(language, turn):
+    """Just listen for the caller, ending the call if they stay silent"""
+    return _template("listen", None, language).render(turn=turn)
+
+
+def play_and_listen(url, language, turn):
+    """Play audio and listen for the caller, who can speak over it"""
+    return _template("play_and_listen", None, language).render(url=url, turn=turn)
+
+
+def say_and_listen(text, voice, language, turn):
+    """Say text with Twilio's TTS and listen for the caller, who can speak over it"""
+    return _template("say_and_listen", voice, language).render(text=text, turn=turn)
+
+
+def play_and_hangup(url):
+    return _template("play_and_hangup", None, None).render(url=url)
+
+
+def say_and_hangup(text, voice, language):
+    return _template("say_and_hangup", voice, language).render(text=text)
+
+
+def play_and_redirect(url, target):
+    return _template("play_and_redirect", None, None).render(url=url, target=target)
+
+
+def say_and_redirect(text, target, voice, language):
+    return _template("say_and_redirect", voice, language).render(text=text, target=target)